@@ -19,14 +19,36 @@ HDFQS Python Library
 This module contains the class and all functions required for reading from and writing to HDFQS data stores.
 """
 
+import copy;
+import json;
+import multiprocessing;
+import numexpr;
 import numpy as np;
 import os;
 import pandas as pd;
 import re;
 import tables;
+import tempfile;
+import threading;
+import time;
+
+try:
+  import fcntl;
+except ImportError: # not available on Windows; manifest writes are not locked
+  fcntl = None;
+
+try:
+  import pyarrow as pa;
+  import pyarrow.parquet as pq;
+except ImportError: # only required to export to Parquet or Arrow IPC
+  pa = None;
+  pq = None;
 
 __version__ = "1.1.0";
 
+# PyTables is not thread-safe, so all HDF5 file access (including by the watcher and compactor threads) is serialized by this lock
+hdf5_lock = threading.RLock();
+
 class HDFQS:
   """
   This class wraps all functionality to read from and write to an HDFQS data store.
@@ -35,23 +57,53 @@ class HDFQS:
 ################################################################################
 ################################# CONSTRUCTOR ##################################
 ################################################################################
-  def __init__(self, path, register=True):
+  def __init__(self, path, register=True, lazy=False, gap_factor=10, file_duration=86400000000000L, layouts=None):
     """
     Create an HDFQS object given the path to the HDFQS data store.
 
     This function automatically runs :meth:`register_directory` on the HDFQS root.
 
+    In lazy mode, no files are read during construction. The manifest is loaded from the per-location manifest shards (see :class:`LazyManifest`) as each location is first used, and :meth:`register_directory` is not run; call it when new files need to be picked up.
+
     Parameters
     ----------
     path : str
       Path of root of HDFQS data store.
+    register : bool
+      Whether or not to load the manifest and register new files (default is True). Ignored in lazy mode.
+    lazy : bool
+      Whether or not to load the manifest lazily, without registering new files (default is False).
+    gap_factor : float
+      Multiple of the typical time between rows above which a gap splits the coverage intervals computed when registering files (default is 10). See :meth:`get_coverage`.
+    file_duration : int64
+      Typical time span of the data in one file, in ns (default is 1 day). Used with the sampling rate of the data to choose the chunk layout of new tables (see :meth:`table_layout`).
+    layouts : dict
+      Chunk layout overrides for specific tables (default is None - no overrides). The keys are HDF5 paths to data tables, the values are dicts with the keys :literal:`expectedrows` and/or :literal:`chunkshape` (number of rows per chunk).
     """
 
     self.path = path;
     self.fd = None;
+    self.gap_factor = gap_factor;
+    self.file_duration = file_duration;
+    self.layouts = layouts if (layouts is not None) else { };
     self.filters = tables.Filters(complevel=1, complib="zlib", shuffle=True, fletcher32=True);
     self.manifest_path = os.path.join(self.path, "manifest.py");
-    if (register):
+    self.manifest_shard_path = os.path.join(self.path, "manifest.d");
+    self.manifest_lock = threading.RLock();
+    self.watcher = None;
+    self.watcher_stop = None;
+    self.watch_mtimes = None;
+    self.watch_dir_mtimes = { };
+    self.watch_failed = { };
+    self.compactor = None;
+    self.compactor_stop = None;
+    self.manifest_lock_path = os.path.join(self.path, "manifest.lock");
+    self.manifest_added = set();
+    self.manifest_removed = set();
+    self.manifest_replace = False;
+    if (lazy):
+      self.manifest = LazyManifest(self.manifest_path, self.manifest_shard_path);
+    elif (register):
       if (os.path.exists(self.manifest_path)):
         temp = { };
         execfile(self.manifest_path, temp);
@@ -63,11 +115,11 @@ class HDFQS:
 ################################################################################
 ################################### REGISTER ###################################
 ################################################################################
-  def register(self, filename, write_manifest=True):
+  def register(self, filename, write_manifest=True, manifest=None):
     """
     Register a file in the HDFQS manifest.
 
-    All HDF5 files within the HDFQS data store need to be registered in the manifest in order to be queried by HDFQS. The manifest associates all data tables with the HDF5 files that contain part of the table, along with the time range contained in each file.
+    All HDF5 files within the HDFQS data store need to be registered in the manifest in order to be queried by HDFQS. The manifest associates all data tables with the HDF5 files that contain part of the table, along with the time range contained in each file, and summary statistics and the schema of the table in each file (see :meth:`scan_table` and :meth:`table_schema`).
 
     Note - all new files in the HDFQS data store are automatically registered when the HDFQS object is created. The use of this function is only required if new files are added into the HDFQS data store after the HDFQS object has been initialized.
 
@@ -77,51 +129,100 @@ class HDFQS:
       Path of file to register. Can be relative to HDFQS root.
     write_manifest : bool
       Whether or not to write the updated manifest to the manifest file (default is True).
+    manifest : dict
+      Manifest to register the file in (default is the manifest of this object).
     """
 
-    filename = os.path.join(self.path, filename); # If an absolute path is given, it does not get appended to the HDFQS path
-    relpath = self.get_relpath(filename);
+    with self.manifest_lock:
+      if (manifest is None):
+        manifest = self.manifest;
+
+      filename = os.path.join(self.path, filename); # If an absolute path is given, it does not get appended to the HDFQS path
+      relpath = self.get_relpath(filename);
+
+      if (relpath in manifest["FILES"]):
+        return;
+
+      with hdf5_lock:
+        fd = tables.openFile(filename, mode="r");
+        entries = [ ];
+        try: # scan all tables before changing the manifest, so a failure leaves it unchanged
+          for location in fd.root:
+            for group in location:
+              for table in group:
+                table = HDFQS.open_table(table);
+                if (table is None):
+                  continue;
+                if (table.shape == ( 0, )):
+                  continue;
+                location_name = location._v_name;
+                group_name = group._v_name;
+                table_name = table.name;
+                path = "/" + location_name + "/" + group_name + "/" + table_name;
+                entry = HDFQS.scan_table(table, gap_factor=self.gap_factor);
+                entry["filename"] = relpath;
+                entry["schema"] = HDFQS.table_schema(table);
+                if ("hdfqs_log_id" in table.attrs._v_attrnames): # see compact
+                  entry["log_id"] = str(table.attrs["hdfqs_log_id"]);
+                entries.append(( path, entry ));
+        finally:
+          fd.close();
+      manifest["FILES"][relpath] = True;
+      for ( path, entry ) in entries:
+        HDFQS.add_entry(manifest, path, entry);
+      self.manifest_added.add(relpath);
+
+      if (write_manifest):
+        self.write_manifest();
 
-    if (relpath in self.manifest["FILES"]):
-      return;
+################################################################################
+################################## UNREGISTER ##################################
+################################################################################
+  def unregister(self, filename, write_manifest=True, manifest=None):
+    """
+    Remove a file from the HDFQS manifest.
 
-    fd = tables.openFile(filename, mode="r");
-    self.manifest["FILES"][relpath] = True;
-    for location in fd.root:
-      for group in location:
-        for table in group:
-          if (type(table) != tables.Table):
-            continue;
-          if (table.shape == ( 0, )):
-            continue;
-          location_name = location._v_name;
-          group_name = group._v_name;
-          table_name = table.name;
-          path = "/" + location_name + "/" + group_name + "/" + table_name;
-          if (table.cols.time.is_indexed):
-            start = table.cols.time[table.colindexes["time"][0]];
-            stop = table.cols.time[table.colindexes["time"][-1]];
-          else:
-            start = min(row["time"] for row in table);
-            stop = max(row["time"] for row in table);
-          if (not self.manifest.has_key(path)):
-            self.manifest[path] = [ { "filename": relpath, "start": start, "stop": stop } ];
-          else:
-            self.manifest[path].append({ "filename": relpath, "start": start, "stop": stop });
-
-          if (location_name not in self.manifest["ROOT"]):
-            self.manifest["ROOT"][location_name] = { };
-          if (group_name not in self.manifest["ROOT"][location_name]):
-            self.manifest["ROOT"][location_name][group_name] = { };
-          if (table_name not in self.manifest["ROOT"][location_name][group_name]):
-            self.manifest["ROOT"][location_name][group_name][table_name] = [ start, stop ];
-          else:
-            ( old_start, old_stop ) = self.manifest["ROOT"][location_name][group_name][table_name];
-            self.manifest["ROOT"][location_name][group_name][table_name] = [ np.minimum(start, old_start), np.maximum(stop, old_stop) ];
-    fd.close();
+    All entries for the file are removed, and the time ranges of the affected tables are recomputed from the remaining files. Tables with no remaining files are removed from the manifest.
 
-    if (write_manifest):
-      self.write_manifest();
+    Parameters
+    ----------
+    filename : str
+      Path of file to unregister. Can be relative to HDFQS root.
+    write_manifest : bool
+      Whether or not to write the updated manifest to the manifest file (default is True).
+    manifest : dict
+      Manifest to remove the file from (default is the manifest of this object).
+    """
+
+    with self.manifest_lock:
+      if (manifest is None):
+        manifest = self.manifest;
+      relpath = self.get_relpath(os.path.join(self.path, filename));
+
+      if (relpath not in manifest["FILES"]):
+        return;
+
+      del manifest["FILES"][relpath];
+      self.manifest_added.discard(relpath);
+      self.manifest_removed.add(relpath);
+      for path in [ key for key in manifest.keys() if (key.startswith("/")) ]:
+        entries = [ entry for entry in manifest[path] if (entry["filename"] != relpath) ];
+        if (len(entries) == len(manifest[path])):
+          continue;
+        ( location_name, group_name, table_name ) = path.split("/")[1:4];
+        if (len(entries) == 0):
+          del manifest[path];
+          del manifest["ROOT"][location_name][group_name][table_name];
+          if (len(manifest["ROOT"][location_name][group_name]) == 0):
+            del manifest["ROOT"][location_name][group_name];
+          if (len(manifest["ROOT"][location_name]) == 0):
+            del manifest["ROOT"][location_name];
+        else:
+          manifest[path] = entries;
+          manifest["ROOT"][location_name][group_name][table_name] = [ min(entry["start"] for entry in entries), max(entry["stop"] for entry in entries) ];
+
+      if (write_manifest):
+        self.write_manifest();
 
 ################################################################################
 ############################## REGISTER DIRECTORY ##############################
@@ -138,33 +239,34 @@ class HDFQS:
       Path of directory to register (default is the HDFQS root). Path can be relative to HDFQS root.
     """
 
-    path = os.path.join(self.path, path);
-    i = 0;
-    is_hdf5 = re.compile("^.*\.h5$");
-    changed = False;
-    for subdir in os.listdir(path):
-      if ((subdir == ".git") or (subdir == "raw") or (subdir == "manifest.py")):
-        continue;
-      subdir = os.path.join(path, subdir);
-      if (os.path.isdir(subdir)): # Is a subdirectory
-        for filename in os.listdir(subdir):
-          if (not is_hdf5.match(filename)):
-            i=i+1;
-            continue;
-          full_path = os.path.join(subdir, filename);
-          relpath = self.get_relpath(full_path);
-          if (relpath not in self.manifest["FILES"]):
-            print full_path;
-            self.register(full_path, write_manifest=False);
+    with self.manifest_lock:
+      path = os.path.join(self.path, path);
+      i = 0;
+      is_hdf5 = re.compile("^.*\.h5$");
+      changed = False;
+      for subdir in os.listdir(path):
+        if ((subdir == ".git") or (subdir == "raw") or (subdir == "manifest.py") or (subdir == "manifest.d") or (subdir == "log")):
+          continue;
+        subdir = os.path.join(path, subdir);
+        if (os.path.isdir(subdir)): # Is a subdirectory
+          for filename in os.listdir(subdir):
+            if (not is_hdf5.match(filename)):
+              i=i+1;
+              continue;
+            full_path = os.path.join(subdir, filename);
+            relpath = self.get_relpath(full_path);
+            if (relpath not in self.manifest["FILES"]):
+              print full_path;
+              self.register(full_path, write_manifest=False);
+              changed = True;
+        elif (is_hdf5.match(subdir)): # Is an HDF5 file in the root
+          if (subdir not in self.manifest["FILES"]):
+            print subdir;
+            self.register(subdir, write_manifest=False);
             changed = True;
-      elif (is_hdf5.match(subdir)): # Is an HDF5 file in the root
-        if (subdir not in self.manifest["FILES"]):
-          print subdir;
-          self.register(subdir, write_manifest=False);
-          changed = True;
 
-    if ((changed) or (not os.path.exists(self.manifest_path))):
-      self.write_manifest();
+      if ((changed) or (not os.path.exists(self.manifest_path))):
+        self.write_manifest();
 
 ################################################################################
 ############################### RE-REGISTER ALL ################################
@@ -173,21 +275,185 @@ class HDFQS:
     """
     Clear the manifest and reregister all HDF5 files in HDFQS data store.
 
-    Use of this function is generally not necessary, unless damage to the manifest file is suspected.
+    Use of this function is generally not necessary, unless damage to the manifest file is suspected. The rebuilt manifest replaces the manifest file, rather than being merged with it (see :meth:`write_manifest`).
+    """
+
+    with self.manifest_lock:
+      self.manifest = { "FILES": { }, "ROOT": { } };
+      self.manifest_replace = True;
+      self.register_directory();
+
+################################################################################
+################################ START WATCHER #################################
+################################################################################
+  def start_watcher(self, interval=60):
+    """
+    Start a background thread which keeps the manifest up to date.
+
+    Every :literal:`interval` seconds, the thread runs :meth:`poll_changes`, which registers new and modified HDF5 files and unregisters deleted ones. The updated manifest replaces the current one in a single assignment, so other threads always see either the old or the new manifest, never a partially updated one. Since PyTables is not thread-safe, the thread reads HDF5 files under the module-level HDF5 lock, which all HDFQS file access in this process also takes.
+
+    Parameters
+    ----------
+    interval : float
+      Time between checks for changes, in seconds (default is 60).
+    """
+
+    if (self.watcher is not None):
+      return;
+
+    stop_event = threading.Event();
+    def watch():
+      while (not stop_event.wait(interval)):
+        try:
+          self.poll_changes();
+        except Exception as e: # keep watching; the next poll retries
+          print "Error polling for changes: %s" % ( e );
+    self.watcher_stop = stop_event;
+    self.watcher = threading.Thread(target=watch, name="hdfqs-watcher");
+    self.watcher.daemon = True;
+    self.watcher.start();
+
+################################################################################
+################################# STOP WATCHER #################################
+################################################################################
+  def stop_watcher(self):
+    """
+    Stop the background thread started by :meth:`start_watcher`.
+    """
+
+    if (self.watcher is None):
+      return;
+
+    self.watcher_stop.set();
+    self.watcher.join();
+    self.watcher = None;
+    self.watcher_stop = None;
+
+################################################################################
+################################# POLL CHANGES #################################
+################################################################################
+  def poll_changes(self):
+    """
+    Check the HDFQS data store for new, modified, and deleted HDF5 files, and update the manifest.
+
+    Directory modification times are tracked so only directories which changed are listed, and file modification times are tracked so files modified since the last check are re-registered. Changes are applied to a copy of the manifest, which then replaces the current manifest in a single assignment. On the first call, files already in the manifest are assumed to be current.
+
+    Files which cannot be registered (e.g. still being written, or not valid HDF5 files) are retried on every call where their modification time or size has changed since the failure, whether or not their directory changes. A modified file which cannot be re-registered is left out of the manifest until it is registered successfully. The manifest is only replaced and written if a file was registered or unregistered.
+
+    Returns
+    -------
+    changed : bool
+      True if the manifest was updated, False otherwise.
     """
 
-    self.manifest = { "FILES": { }, "ROOT": { } };
-    self.register_directory();
+    with self.manifest_lock:
+      first = (self.watch_mtimes is None);
+      if (first):
+        self.watch_mtimes = { };
+      files = self.manifest["FILES"];
+
+      # List directories which changed since last check
+      candidates = set(self.watch_mtimes.keys()) | set(self.watch_failed.keys());
+      dirs = [ self.path ] + [ x for x in self.watch_dir_mtimes.keys() if (x != self.path) ];
+      for path in dirs:
+        try:
+          mtime = os.path.getmtime(path);
+        except OSError: # directory removed
+          del self.watch_dir_mtimes[path];
+          continue;
+        if (self.watch_dir_mtimes.get(path) == mtime):
+          continue;
+        self.watch_dir_mtimes[path] = mtime;
+        ( subdirs, filenames ) = self.list_directory(path);
+        candidates.update(filenames);
+        if (path == self.path):
+          for subdir in subdirs:
+            if (subdir not in self.watch_dir_mtimes):
+              self.watch_dir_mtimes[subdir] = os.path.getmtime(subdir);
+              candidates.update(self.list_directory(subdir)[1]);
+
+      # Compare file modification times
+      added = [ ];
+      removed = [ ];
+      for full_path in candidates:
+        relpath = self.get_relpath(full_path);
+        try:
+          stat = os.stat(full_path);
+        except OSError: # file removed
+          self.watch_mtimes.pop(full_path, None);
+          self.watch_failed.pop(full_path, None);
+          if (relpath in files):
+            removed.append(relpath);
+          continue;
+        mtime = stat.st_mtime;
+        if (full_path in self.watch_failed): # retry only if the file changed since it failed
+          if (self.watch_failed[full_path] != ( stat.st_mtime, stat.st_size )):
+            added.append(full_path);
+          continue;
+        old_mtime = self.watch_mtimes.get(full_path);
+        self.watch_mtimes[full_path] = mtime;
+        if (old_mtime is None):
+          if (relpath not in files):
+            added.append(full_path);
+        elif (old_mtime != mtime):
+          removed.append(relpath);
+          added.append(full_path);
+
+      if ((len(added) == 0) and (len(removed) == 0)):
+        return False;
+
+      # Apply changes to a copy of the manifest, then swap it in
+      manifest = copy.deepcopy(dict(self.manifest.items()));
+      changed = False;
+      for relpath in removed:
+        if (relpath in manifest["FILES"]):
+          self.unregister(relpath, write_manifest=False, manifest=manifest);
+          changed = True;
+      for full_path in added:
+        try:
+          self.register(full_path, write_manifest=False, manifest=manifest);
+          self.watch_failed.pop(full_path, None);
+          self.watch_mtimes[full_path] = os.path.getmtime(full_path);
+          changed = True;
+          print full_path;
+        except Exception as e:
+          self.watch_mtimes.pop(full_path, None);
+          try:
+            stat = os.stat(full_path);
+            self.watch_failed[full_path] = ( stat.st_mtime, stat.st_size );
+          except OSError: # file removed
+            self.watch_failed.pop(full_path, None);
+          print "Error registering %s: %s" % ( full_path, e );
+      if (not changed):
+        return False;
+      self.manifest = manifest;
+      self.write_manifest();
+
+    return True;
 
 ################################################################################
 ##################################### LOAD #####################################
 ################################################################################
-  def load(self, path, start, stop, numpts=0, time_field="time", value_field="value"):
+  def load(self, path, start, stop, numpts=0, time_field="time", value_field="value", conditions=None, mask=False, output="array", fields=None, merge=False):
     """
     Return data from the specified table and time range.
 
     This function loads data in the HDFQS data store from the specified data table within the specified time range. Note that the time range includes the endpoints. For tables with multiple value fields (e.g. x, y, z), only a single value field may be loaded. An optional parameter can specify the number of datapoints to return, in which case the specified number of datapoints, as evenly spaced as possible within the time range, will be returned.
 
+    For files whose time column is recorded as sorted in the manifest, the row range is found by a binary search on the time column and read directly, without evaluating a query condition over the table.
+
+    Data in the append log of the table which has not been compacted yet (see :meth:`append`) is included after the data from the HDF5 files. :literal:`numpts` is not applied to the log.
+
+    Additional conditions on any column can be specified as a list of :samp:`( {column}, {operator}, {value} )` tuples, e.g.::
+
+      load({path}, {start}, {stop}, conditions=[ ( "status", "==", 0 ), ( "value", ">", 30 ) ]);
+
+    The conditions are combined with "and", and evaluated by PyTables (numexpr) with the values passed as bound variables. By default, rows not matching the conditions are omitted. If :literal:`mask` is True, all rows in the time range are returned, with the value masked for rows not matching the conditions.
+
+    By default, the time and value are returned together in a 2D array, which has a single dtype (e.g. int64 times are converted to float64 when loading a float64 value). To keep each column in its own dtype, set :literal:`output` to "dict" (a dict of numpy arrays) or "arrow" (a :literal:`pyarrow.Table`, assembled from the data of each file without concatenating it). Other columns can then be loaded along with the time and value by listing them in :literal:`fields`.
+
+    By default, the data from each file is returned in the order the files are listed in the manifest. If :literal:`merge` is True, the data is returned sorted by time, and rows which are exact duplicates (e.g. from a file and its re-import) are dropped. If the manifest shows the files' time ranges do not overlap and each file is sorted, the files are simply returned in time order, without sorting the data.
+
     Parameters
     ----------
     path : str
@@ -202,646 +468,3741 @@ class HDFQS:
       Name of the time field in the table (default is "time").
     value_field : str
       Name of the value field to load (default is "value").
+    conditions : list
+      List of :samp:`( {column}, {operator}, {value} )` tuples. Operator must be one of "==", "!=", "<", "<=", ">", ">=" (default is no conditions).
+    mask : bool
+      Whether to mask the value of rows not matching :literal:`conditions` instead of omitting them (default is False).
+    output : str
+      Type of data to return, one of "array", "dict", "arrow" (default is "array").
+    fields : list
+      Additional fields to load, if :literal:`output` is "dict" or "arrow" (default is None - load only the time and value).
+    merge : bool
+      Whether to sort the data by time and drop duplicate rows (default is False).
 
     Returns
     -------
-    data : numpy.ma.array
-      An Nx2 array containing the requested data. The first column is the time, the second column is the value.
+    data : numpy.ma.array, dict, or pyarrow.Table
+      If :literal:`output` is "array", an Nx2 array containing the requested data. The first column is the time, the second column is the value. If :literal:`output` is "dict", a dict mapping each field to a numpy array (a :literal:`numpy.ma.array` for the value, if :literal:`mask` is True). If :literal:`output` is "arrow", a :literal:`pyarrow.Table` with one column per field (masked values are null).
+
+    Raises
+    ------
+    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
+      Invalid column or operator in :literal:`conditions`, or unsupported output type.
+    ImportError
+      :literal:`output` is "arrow", but :literal:`pyarrow` is not installed.
     """
 
-    files = self.query(path, start, stop);
-    data = None;
-    for f in files:
-      fd = tables.openFile(os.path.join(self.path, f), mode="r");
-      t = fd.getNode(path);
-      if (len(t) < 2):
+    if (output not in [ "array", "dict", "arrow" ]):
+      raise InconsistentArgumentsException("Unsupported output type \"%s\"" % ( output ));
+    if ((output == "arrow") and (pa is None)):
+      raise ImportError("pyarrow is required for arrow output");
+    names = [ time_field, value_field ];
+    if ((output != "array") and (fields is not None)):
+      names = names + [ x for x in fields if (x not in names) ];
+
+    entries = self.query_entries(path, start, stop);
+    if ((conditions is not None) and (not mask)): # skip files with no rows matching conditions
+      entries = [ entry for entry in entries if (HDFQS.entry_may_match(entry, conditions)) ];
+    if (merge):
+      entries = sorted(entries, key=lambda entry: entry["start"]);
+    parts = [ ];
+    for entry in entries:
+      with hdf5_lock:
+        fd = tables.openFile(os.path.join(self.path, entry["filename"]), mode="r");
+        t = HDFQS.open_table(fd.getNode(path));
+        if (len(t) < 2):
+          fd.close();
+          continue;
+        if (numpts == 0): # load all points
+          stride = 1;
+        else:
+          time_res = t[1][time_field] - t[0][time_field];
+          stride_time = (stop - start) / np.float64(numpts);
+          stride = max(int(np.floor(stride_time / time_res)), 1); # stride of 1 if more pixels than datapoints in time range
+        try:
+          ( condition, condvars ) = HDFQS.compile_conditions(t.colnames, conditions);
+        except InconsistentArgumentsException:
+          fd.close();
+          raise;
+        if ((time_field == "time") and (entry.get("sorted", False))): # read row range directly
+          if (isinstance(t, EncodedTable)):
+            first = t.search_sorted(start, side="left");
+            last = t.search_sorted(stop, side="right");
+          else:
+            col = t.cols._f_col(time_field);
+            first = HDFQS.search_sorted(col, start, side="left");
+            last = HDFQS.search_sorted(col, stop, side="right");
+          if ((condition is None) or (mask)):
+            rows = t.read(first, last, stride);
+          else:
+            rows = t.read_where(condition, condvars, start=first, stop=last, step=stride);
+        else:
+          time_condition = "(%s >= hdfqs_start) & (%s <= hdfqs_stop)" % ( time_field, time_field );
+          time_condvars = { "hdfqs_start": np.int64(start), "hdfqs_stop": np.int64(stop) };
+          if ((condition is not None) and (not mask)):
+            time_condition = "%s & %s" % ( time_condition, condition );
+            time_condvars.update(condvars);
+          rows = t.read_where(time_condition, time_condvars, step=stride);
+        fd.close();
+      if (len(rows) == 0):
         continue;
-      if (numpts == 0): # load all points
-        data_from_file = np.ma.array([ [ x[time_field], x[value_field] ] for x in fd.getNode(path).where("(%s >= %d) & (%s <= %d)" % ( time_field, start, time_field, stop )) ]);
-      else:
-        temp = t[0:2];
-        time_res = t[1][time_field] - t[0][time_field];
-        stride_time = (stop - start) / np.float64(numpts);
-        stride = int(np.floor(stride_time / time_res));
-        if (stride > 0):
-          data_from_file = np.ma.array([ [ x[time_field], x[value_field] ] for x in fd.getNode(path).where("(%s >= %d) & (%s <= %d)" % ( time_field, start, time_field, stop ), step=stride) ]);
-        else: # more pixels than datapoints in time range
-          data_from_file = np.ma.array([ [ x[time_field], x[value_field] ] for x in fd.getNode(path).where("(%s >= %d) & (%s <= %d)" % ( time_field, start, time_field, stop )) ]);
-      if (len(data_from_file) > 0):
-        if (data is None):
-          data = data_from_file;
+      invalid = None;
+      if ((condition is not None) and (mask)):
+        condvars.update((name, rows[name]) for name in rows.dtype.names);
+        invalid = ~(numexpr.evaluate(condition, local_dict=condvars));
+      parts.append(( rows, invalid ));
+
+    log = self.read_log(path);
+    if (log is not None):
+      rows = log[(log[time_field] >= start) & (log[time_field] <= stop)];
+      ( condition, condvars ) = HDFQS.compile_conditions(log.dtype.names, conditions);
+      if ((len(rows) > 0) and (condition is not None)):
+        condvars.update((name, rows[name]) for name in rows.dtype.names);
+        match = numexpr.evaluate(condition, local_dict=condvars);
+        if (mask):
+          parts.append(( rows, ~match ));
         else:
-          data = np.concatenate(( data, data_from_file ));
-      fd.close();
+          parts.append(( rows[match], None ));
+      elif (len(rows) > 0):
+        parts.append(( rows, None ));
+      if (len(rows) > 0): # log rows are not sorted, so they are sorted in with the other rows if merge is set
+        entries = entries + [ { "start": rows[time_field].min(), "stop": rows[time_field].max(), "sorted": False } ];
 
-    if (data is None):
-      return np.transpose(np.ma.array([ [ ], [ ] ]));
-    else:
-      return data;
+    if ((merge) and (HDFQS.entries_overlap(entries, time_field))):
+      parts = HDFQS.merge_parts(parts, time_field);
+    dtypes = self.get_dtypes(path) if (len(parts) == 0) else None;
+    return HDFQS.assemble(parts, names, output, mask and (conditions is not None) and (len(conditions) > 0), dtypes);
 
 ################################################################################
-################################## GET FIELDS ##################################
+################################## AGGREGATE ###################################
 ################################################################################
-  def get_fields(self, path):
+  def aggregate(self, path, start, stop, bucket, funcs=None, fields=None, bins=1000):
     """
-    Return all fields in a data table.
+    Return per-bucket summary statistics from the specified table and time range.
+
+    The time range is divided into fixed-size buckets of :literal:`bucket` ns, starting at :literal:`start`. Data is streamed from the files in blocks, and each block is reduced into the bucket arrays, so memory use scales with the number of buckets rather than the number of rows. Note that the time range includes the endpoints.
+
+    NaN and infinite values are ignored (as in :meth:`scan_table`); the :samp:`{field}_count` statistic is the number of finite values of the field in each bucket.
+
+    Percentiles are approximate. The values of each field are counted in a histogram of :literal:`bins` equal-width bins per bucket, spanning the range of the field in the time range (from the manifest statistics, see :meth:`get_stats`), and the percentile is interpolated within the bin containing it, so the error is at most the bin width. The histograms use :literal:`bins` integers per bucket and field.
+
+    Event-only tables (tables with only the :literal:`time` and :literal:`tz` columns) return only the number of events in each bucket.
 
     Parameters
     ----------
     path : str
       HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    bucket : int64
+      Bucket size, in ns (e.g. 60E9 for one minute).
+    funcs : list
+      Summary statistics to compute for each field. Any of "count", "sum", "mean", "min", "max", "std", and percentiles as :samp:`p{q}` with :samp:`{q}` between 0 and 100 (e.g. "p50", "p99.9") (default is [ "mean", "min", "max", "count" ]).
+    fields : list
+      Fields to summarize (default is all fields except :literal:`time` and :literal:`tz`).
+    bins : int
+      Number of histogram bins per bucket used for percentiles (default is 1000).
 
     Returns
     -------
-    fields : list
-      List containing the fields of the data table.
+    df : pd.DataFrame
+      DataFrame with a :literal:`time` column containing the start time of each bucket, and one column per field and statistic, named :samp:`{field}_{func}`. For event-only tables, a single :literal:`count` column is returned. Statistics of buckets with no finite values are NaN, except for counts, which are 0.
 
     Raises
     ------
-    Exception
-      Specified path does not exist.
+    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
+      Unsupported statistic in :literal:`funcs`, or :literal:`bucket` or :literal:`bins` is not positive.
     """
 
-    files = self.query(path, 0, np.Inf);
-    if (len(files) == 0):
-      raise Exception("Nonexistant path: \"%s\"" % path);
-    else:
-      filename = files[0];
-      fd = tables.openFile(os.path.join(self.path, filename));
-      table = fd.getNode(path);
-      fields = table.colnames;
-      fd.close();
-      return fields;
+    start = np.int64(start);
+    stop = np.int64(stop);
+    bucket = np.int64(bucket);
+    if (bucket <= 0):
+      raise InconsistentArgumentsException("bucket must be positive");
+    if (bins <= 0):
+      raise InconsistentArgumentsException("bins must be positive");
+    if (funcs is None):
+      funcs = [ "mean", "min", "max", "count" ];
+    percentiles = { };
+    for func in funcs:
+      match = re.match(r"^p(\d+(\.\d*)?)$", func);
+      if ((match is not None) and (float(match.group(1)) <= 100)):
+        percentiles[func] = float(match.group(1));
+      elif (func not in [ "count", "sum", "mean", "min", "max", "std" ]):
+        raise InconsistentArgumentsException("Unsupported aggregate function \"%s\"" % ( func ));
+    if (fields is None):
+      fields = [ x for x in self.get_fields(path) if (x not in [ "time", "tz" ]) ];
+
+    nbuckets = max(int((stop - start) // bucket) + 1, 0);
+    count = np.zeros(nbuckets, dtype=np.int64);
+    n = dict((field, np.zeros(nbuckets, dtype=np.int64)) for field in fields);
+    total = dict((field, np.zeros(nbuckets)) for field in fields);
+    total_sq = dict((field, np.zeros(nbuckets)) for field in fields);
+    low = dict((field, np.repeat(np.inf, nbuckets)) for field in fields);
+    high = dict((field, np.repeat(-np.inf, nbuckets)) for field in fields);
+    if (len(percentiles) > 0):
+      value_range = self.value_range(path, start, stop, fields);
+      hist = dict((field, np.zeros(nbuckets * bins, dtype=np.int64)) for field in fields);
+
+    for chunk in self.iter_chunks(path, start, stop, fields=[ "time" ] + fields):
+      idx = ((chunk["time"] - start) // bucket).astype(np.intp);
+      count += np.bincount(idx, minlength=nbuckets);
+      if (len(fields) == 0):
+        continue;
+      in_order = np.all(idx[1:] >= idx[:-1]);
+      if (in_order): # boundaries of each run of rows in the same bucket
+        bounds = np.r_[ 0, np.flatnonzero(np.diff(idx)) + 1 ];
+      for field in fields:
+        x = chunk[field].astype(np.float64);
+        finite = np.isfinite(x);
+        n[field] += np.bincount(idx, weights=finite, minlength=nbuckets).astype(np.int64);
+        x0 = np.where(finite, x, 0);
+        total[field] += np.bincount(idx, weights=x0, minlength=nbuckets);
+        if ("std" in funcs):
+          total_sq[field] += np.bincount(idx, weights=x0*x0, minlength=nbuckets);
+        x_low = np.where(finite, x, np.inf);
+        x_high = np.where(finite, x, -np.inf);
+        if (in_order):
+          low[field][idx[bounds]] = np.minimum(low[field][idx[bounds]], np.minimum.reduceat(x_low, bounds));
+          high[field][idx[bounds]] = np.maximum(high[field][idx[bounds]], np.maximum.reduceat(x_high, bounds));
+        else:
+          np.minimum.at(low[field], idx, x_low);
+          np.maximum.at(high[field], idx, x_high);
+        if ((len(percentiles) > 0) and (value_range[field] is not None)):
+          ( lo, width ) = ( value_range[field][0], (value_range[field][1] - value_range[field][0]) / float(bins) );
+          b = np.zeros(len(x), dtype=np.intp) if (width == 0) else np.clip(((x0 - lo) / width).astype(np.intp), 0, bins - 1);
+          hist[field] += np.bincount((idx * bins + b)[finite], minlength=nbuckets * bins);
+
+    df = pd.DataFrame();
+    df["time"] = start + bucket * np.arange(nbuckets, dtype=np.int64);
+    if (len(fields) == 0):
+      df["count"] = count;
+      return df;
+    with np.errstate(invalid="ignore", divide="ignore"):
+      for field in fields:
+        empty = (n[field] == 0);
+        mean = total[field] / n[field];
+        for func in funcs:
+          if (func == "count"):
+            df["%s_count" % ( field )] = n[field];
+          elif (func == "sum"):
+            df["%s_sum" % ( field )] = np.where(empty, np.nan, total[field]);
+          elif (func == "mean"):
+            df["%s_mean" % ( field )] = mean;
+          elif (func == "min"):
+            df["%s_min" % ( field )] = np.where(empty, np.nan, low[field]);
+          elif (func == "max"):
+            df["%s_max" % ( field )] = np.where(empty, np.nan, high[field]);
+          elif (func == "std"):
+            df["%s_std" % ( field )] = np.sqrt(np.maximum(total_sq[field] / n[field] - mean*mean, 0));
+          elif (value_range[field] is None):
+            df["%s_%s" % ( field, func )] = np.repeat(np.nan, nbuckets);
+          else:
+            df["%s_%s" % ( field, func )] = HDFQS.histogram_percentile(hist[field].reshape(( nbuckets, bins )), n[field], percentiles[func], value_range[field], low[field], high[field]);
+
+    return df;
 
 ################################################################################
-################################### SANITIZE ###################################
+#################################### EXPORT ####################################
 ################################################################################
-  def sanitize(self, filename, min_time=31536000000000000L, index=True):
+  def export(self, paths, start, stop, format, dest, workers=1):
     """
-    Sanitize all tables in specified file.
+    Export data from the specified tables and time range to Parquet, Arrow IPC, or CSV files.
+
+    Data is streamed from the HDF5 files in blocks (see :meth:`iter_chunks`) and appended to the output file, so memory use does not depend on the amount of data exported. All columns are exported with their dtypes. The table's :literal:`units` attribute is stored in the file metadata (key :literal:`hdfqs.units`, as JSON) for Parquet and Arrow IPC; for CSV, the units and dtypes are written to a :samp:`{table}.json` file next to the CSV file.
 
-    For each table in the file, this function removes all data entries with an invalid time (any time before the specified minimum time), and optionally adds a completely-sorted index on the time column (to speed up loading data).
+    Each table is written to :samp:`{dest}/{location}/{category}/{table}.{ext}`. With more than one worker, tables are exported in parallel by separate processes.
+
+    Parquet and Arrow IPC require :literal:`pyarrow`.
 
     Parameters
     ----------
-    filename : str
-      Name of HDF5 file (absolute or relative to HDFQS root).
-    min_time : int64
-      Earliest valid time, in ns since the epoch (default is 1/1/1971 00:00:00 UTC).
-    index : bool
-      Whether or not to create a completely-sorted index on the time column (default is True).
-    """
+    paths : list
+      HDF5 paths to the data tables. May also be a single path.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    format : str
+      Output format, one of "parquet", "arrow", "csv".
+    dest : str
+      Directory to write to.
+    workers : int
+      Number of worker processes (default is 1 - export in this process).
 
-    filename = os.path.join(self.path, filename);
-    fd = tables.openFile(filename, mode="a");
-    print filename;
-
-    g = fd.root;
-    for loc in g._v_children.items():
-      loc = loc[1];
-      for cat in loc._v_children.items():
-        cat = cat[1];
-        for t in cat._v_children.items():
-          t = t[1];
-
-          # Check if table is empty
-          if (t.shape == ( 0, )):
-            print "0%s" % ( t.name );
-            continue;
+    Returns
+    -------
+    nrows : dict
+      Number of rows exported, for each table.
 
-          # Check for time before minimum
-          bad_rows = t.read_where("time < min_time", { "min_time": min_time });
-          if (bad_rows.shape[0] > 0):
-            x = "-%s,%d" % ( t.name, t.shape[0] );
-            tname = t.name;
-            tnew = fd.createTable(cat, "%s_new" % ( tname ), t.description, t.title, filters=t.filters);
-            t.attrs._f_copy(tnew);
-            t.append_where(tnew, "time >= min_time", { "min_time": min_time });
-            tnew.flush();
-            t.remove();
-            tnew.move(None, tname);
-            x = "%s,%d,%d" % ( x, tnew.shape[0], bad_rows.shape[0] );
-            print x;
-            t = tnew;
+    Raises
+    ------
+    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
+      Unsupported format.
+    ImportError
+      :literal:`pyarrow` is required for the requested format, but is not installed.
+    """
 
-          # Check if table is empty
-          if (t.shape == ( 0, )):
-            print "0%s" % ( t.name );
-            continue;
+    if (format not in [ "parquet", "arrow", "csv" ]):
+      raise InconsistentArgumentsException("Unsupported export format \"%s\"" % ( format ));
+    if ((format != "csv") and (pa is None)):
+      raise ImportError("pyarrow is required to export to %s" % ( format ));
+    if (isinstance(paths, basestring)):
+      paths = [ paths ];
 
-          # Check for existance of time index
-          if (index and (not t.cols.time.is_indexed)):
-            print "*%s" % ( t.name );
-            t.cols.time.create_csindex();
+    tasks = [ ( self.path, { path: self.manifest[path] }, path, start, stop, format, dest ) for path in paths ];
+    if (workers > 1):
+      pool = multiprocessing.Pool(workers);
+      try:
+        counts = pool.map(run_export, tasks);
+      finally:
+        pool.close();
+        pool.join();
+    else:
+      counts = [ run_export(task) for task in tasks ];
 
-    fd.close();
+    return dict(zip(paths, counts));
 
 ################################################################################
-############################## SANITIZE DIRECTORY ##############################
+################################## MAP REDUCE ##################################
 ################################################################################
-  def sanitize_directory(self, path, no_links=False, min_time=31536000000000000L, index=True):
+  def map_reduce(self, path, start, stop, map_fn, reduce_fn, workers=1, chunk=None, overlap=0):
     """
-    Sanitize all files in the specified directory.
-    
-    Run :meth:`sanitize` on all HDF5 files in the specified directory, recursing through all subdirectories. Links may be optionally ignored, for use with git annex. In this case, all files added into git annex can be assumed to be sanitized, while files not yet added (or which have been unlocked) will be sanitized.
+    Apply a function to the data of a table in segments, in parallel, and combine the results.
 
-    Parameters
-    ----------
-    path : str
-      Path of directory to sanitize.
-    no_links : bool
-      Whether or not to ignore symlinks (default is False).
-    min_time : int64
-      Earliest valid time, in ns since the epoch (default is 1/1/1971 00:00:00 UTC).
-    index : bool
-      Whether or not to create a completed-sorted index on the time column (Default is False).
+    The time range is split into segments using the time ranges of the files in the manifest: one segment per file (or per set of overlapping files), further split into segments of :literal:`chunk` ns if specified. Each segment is loaded (with :literal:`merge=True` and :literal:`output="dict"`, with all fields), and passed to :literal:`map_fn` as::
 
-    Raises
-    ------
-    OSError
-      Specified path does not exist.
-    """
+      map_fn({data}, {segment_start}, {segment_stop});
 
-    path = os.path.join(self.path, path);
-    if (not os.path.exists(path)):
-      raise OSError("Invalid path - \"%s\"" % ( path ));
-    for filename in os.listdir(path):
-      if ((filename == ".git") or (filename == "raw")):
-        continue;
+    To keep windowed computations correct at segment boundaries, the data passed to :literal:`map_fn` also includes the :literal:`overlap` ns of data before the segment start. :literal:`map_fn` should only return results for times from :literal:`segment_start` to :literal:`segment_stop` (inclusive), and use the earlier data as context.
 
-      full_path = os.path.join(path, filename);
-      if (os.path.isdir(full_path)):
-        self.sanitize_directory(full_path, min_time=min_time, index=index);
-      elif (no_links and os.path.islink(full_path)):
-        continue;
-      elif (filename[-3:] == ".h5"):
-        self.sanitize(full_path, min_time=min_time, index=index);
+    The results of all segments, in time order, are combined with :literal:`reduce(reduce_fn, results)`.
+
+    With more than one worker, segments are processed by a :literal:`multiprocessing` pool, so :literal:`map_fn` must be picklable (e.g. a module-level function).
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    map_fn : function
+      Function applied to each segment (see above).
+    reduce_fn : function
+      Function of two arguments used to combine the results of the segments.
+    workers : int
+      Number of worker processes (default is 1 - process in this process).
+    chunk : int64
+      Maximum length of a segment, in ns (default is None - one segment per file).
+    overlap : int64
+      Length of data before each segment to include as context, in ns (default is 0).
 
-################################################################################
-################################ GET LOCATIONS #################################
-################################################################################
-  def get_locations(self):
-    """
-    Return all locations within HDFQS data store.
-  
     Returns
     -------
-    locations : list
-      List containing all locations within HDFQS data store.
+    result : object
+      Combined result, or None if there is no data in the time range.
     """
 
-    return self.manifest["ROOT"].keys();
+    # Split time range into segments
+    ranges = sorted(( max(entry["start"], start), min(entry["stop"], stop) ) for entry in self.query_entries(path, start, stop));
+    intervals = [ ];
+    for ( a, b ) in ranges:
+      if ((len(intervals) > 0) and (a <= intervals[-1][1])):
+        intervals[-1][1] = max(intervals[-1][1], b);
+      else:
+        intervals.append([ a, b ]);
+    segments = [ ];
+    for ( a, b ) in intervals:
+      if (chunk is None):
+        segments.append(( a, b ));
+      else:
+        for x in range(int(a), int(b) + 1, int(chunk)):
+          segments.append(( x, min(x + int(chunk) - 1, b) ));
+    if (len(segments) == 0):
+      return None;
+
+    fields = self.get_fields(path);
+    tasks = [ ( self.path, { path: self.manifest[path] }, path, a, b, overlap, fields, map_fn ) for ( a, b ) in segments ];
+    if (workers > 1):
+      pool = multiprocessing.Pool(workers);
+      try:
+        results = pool.map(run_map, tasks);
+      finally:
+        pool.close();
+        pool.join();
+    else:
+      results = [ run_map(task) for task in tasks ];
+
+    return reduce(reduce_fn, results);
 
 ################################################################################
-################################ GET CATEGORIES ################################
+################################## GET STATS ###################################
 ################################################################################
-  def get_categories(self, location):
+  def get_stats(self, path, start=None, stop=None):
     """
-    Return all categories within specified location
-
-    There are two ways to call this function. Either specify the location::
-
-      get_categories({location});
-
-    or specify the HDF5 path to the location::
+    Return summary statistics of a table from the manifest, without opening any files.
 
-      get_categories({path_in_hdf5});
+    The statistics of each file containing data from the table (or, if a time range is given, of each file overlapping the time range) are combined. Note that the statistics are per file, so files which are only partly within the time range are included in full. Files registered without summary statistics (by an older version of HDFQS) are counted in :literal:`files` only; reregister them (see :meth:`reregister_all`) to include them.
 
     Parameters
     ----------
-    location : str
-      Location under which to search for categories. This may instead be a string containing the path in HDF5 to the location (must start with a "/").
+    path : str
+      HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch (default is None - no limit).
+    stop : int64
+      End of time range, in ns since the epoch (default is None - no limit).
 
     Returns
     -------
-    categories : str
-      List containing all categories within the specified location.
+    stats : dict
+      Dict with the keys :literal:`files` (number of files), :literal:`rows` (total number of rows), :literal:`start` and :literal:`stop` (time range), :literal:`interval` (typical time between rows, the median over files), and :literal:`min`, :literal:`max`, and :literal:`sum` (dicts of per-column statistics, see :meth:`scan_table`).
 
     Raises
     ------
     NonexistantLocationException : :class:`NonexistantLocationException`
-      Specified path or :samp:`/{location}` does not exist.
+      Specified path does not exist.
     """
 
-    try:
-      if (location[0] == "/"):
-        location = location[1:];
-      return self.manifest["ROOT"][location].keys();
-    except:
-      raise NonexistantLocationException("Invalid location \"%s\"" % ( location ));
+    if (not self.manifest.has_key(path)):
+      raise NonexistantLocationException("Nonexistant path: \"%s\"" % ( path ));
+    entries = self.query_entries(path, -np.inf if (start is None) else start, np.inf if (stop is None) else stop);
+
+    stats = { "files": len(entries), "rows": 0, "start": None, "stop": None, "interval": None, "min": { }, "max": { }, "sum": { } };
+    intervals = [ ];
+    for entry in entries:
+      stats["start"] = entry["start"] if (stats["start"] is None) else min(stats["start"], entry["start"]);
+      stats["stop"] = entry["stop"] if (stats["stop"] is None) else max(stats["stop"], entry["stop"]);
+      if ("rows" not in entry):
+        continue;
+      stats["rows"] = stats["rows"] + entry["rows"];
+      if (entry["interval"] is not None):
+        intervals.append(entry["interval"]);
+      for ( key, combine ) in [ ( "min", min ), ( "max", max ), ( "sum", lambda a, b: a + b ) ]:
+        for ( column, value ) in entry[key].items():
+          if (value is None):
+            continue;
+          old = stats[key].get(column);
+          stats[key][column] = value if (old is None) else combine(old, value);
+    if (len(intervals) > 0):
+      stats["interval"] = float(np.median(intervals));
+
+    return stats;
 
 ################################################################################
-################################## GET TABLES ##################################
+################################# QUERY WHERE ##################################
 ################################################################################
-  def get_tables(self, location, category=None):
+  def query_where(self, path, start, stop, conditions):
     """
-    Return all tables within specified category
-
-    There are two ways to call this function. Either specify the location and category separately::
-
-      get_tables({location}, {category});
-
-    or specify the HDF5 path to the category::
+    Return filenames which may contain rows from the specified table and time range matching a list of conditions.
 
-      get_tables({path_in_hdf5});
+    Files are pruned using the per-column minimum and maximum in the manifest, without opening them. For example, with the condition :literal:`( "value", ">", 180 )`, files whose maximum value is at most 180 are not returned. The files returned may still contain no matching rows.
 
     Parameters
     ----------
-    location : str
-      Location containing the specified category. This may instead be a string containing the path in HDF5 to the category (must start with a "/").
-    category : str
-      Category under which to search for tables. Omit this parameter if specifying the category as a path in HDF5 (see :literal:`location` above).
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    conditions : list
+      List of :samp:`( {column}, {operator}, {value} )` tuples (see :meth:`load`).
 
     Returns
     -------
-    tables : str
-      List containing all tables within the specified location.
+    files : list
+      List of filenames which may contain matching rows.
+    """
 
-    Raises
-    ------
-    NonexistantLocationException : :class:`NonexistantLocationException`
-      Specified path or :samp:`/{location}/{category}` does not exist.
-    """
-
-    try:
-      if (category is None):
-        x = re.match("/(.+)/(.+)", location);
-        location = x.group(1);
-        category = x.group(2);
-      return self.manifest["ROOT"][location][category].keys();
-    except:
-      raise NonexistantLocationException("Invalid location/category: \"%s\", \"%s\"" % ( location, category ));
+    return [ entry["filename"] for entry in self.query_entries(path, start, stop) if (HDFQS.entry_may_match(entry, conditions)) ];
 
 ################################################################################
-################################ GET TIME RANGE ################################
+################################# GET COVERAGE #################################
 ################################################################################
-  def get_time_range(self, location, category=None, table=None):
+  def get_coverage(self, path, start, stop):
     """
-    Return the minimum and maximum time of data in the specified table.
-
-    There are two ways to call this function. Either specify the location, category, and table separately::
-
-      get_time_range({location}, {category}, {table});
-
-    or specify the HDF5 path to the table::
+    Return the time intervals in which the specified table contains data, from the manifest.
 
-      get_time_range({path_in_hdf5});
+    The coverage intervals computed when each file was registered (see :meth:`scan_table`) are clipped to the time range and combined. Intervals from different files are joined if the gap between them is no longer than :literal:`gap_factor` times the typical time between rows. Files registered without coverage intervals (by an older version of HDFQS) are treated as covering their whole time range.
 
     Parameters
     ----------
-    location : str
-      Location containing the specified category. This may instead be a string containing the path in HDF5 to the table (must start with a "/").
-    category : str
-      Category containing the specified table. Omit this parameter if specifying the table as a path in HDF5 (see :literal:`location` above).
-    table : str
-      Table to query for minimum and maximum time of data. Omit this parameter if specifying the table as a path in HDF5 (see :literal:`location` above).
+    path : str
+      HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
 
     Returns
     -------
-    time_range : list
-      List containing minuimum time as element 0, maximum time as element 1.
-
-    Raises
-    ------
-    NonexistantLocationException : :class:`NonexistantLocationException`
-      Specified path or :samp:`/{location}/{category}/{table}` does not exist.
+    coverage : list
+      Sorted list of non-overlapping :literal:`[ start, stop ]` intervals, in ns since the epoch.
     """
 
-    try:
-      if ((category is None) and (table is None)):
-        x = re.match("/(.+)/(.+)/(.+)", location);
-        location = x.group(1);
-        category = x.group(2);
-        table = x.group(3);
-      return self.manifest["ROOT"][location][category][table];
-    except:
-      raise NonexistantLocationException("Invalid location/category/table: \"%s\", \"%s\", \"%s\"" % ( location, category, table ));
+    intervals = [ ];
+    for entry in self.query_entries(path, start, stop):
+      gap = self.gap_factor * (entry.get("interval") or 0);
+      for ( a, b ) in entry.get("coverage", [ [ entry["start"], entry["stop"] ] ]):
+        if ((a <= stop) and (b >= start)):
+          intervals.append(( max(a, start), min(b, stop), gap ));
+    intervals.sort();
+
+    coverage = [ ];
+    last_gap = 0;
+    for ( a, b, gap ) in intervals:
+      if ((len(coverage) > 0) and (a - coverage[-1][1] <= max(gap, last_gap))):
+        coverage[-1][1] = max(coverage[-1][1], b);
+      else:
+        coverage.append([ a, b ]);
+      last_gap = gap;
+
+    return coverage;
 
 ################################################################################
-#################################### EXISTS ####################################
+################################## GET FIELDS ##################################
 ################################################################################
-  def exists(self, location, category=None, table=None):
+  def get_fields(self, path):
     """
-    Check if a specified location/category/table exists.
-
-    There are two ways to call this function. Either specify the location, category, and table separately::
-
-      exists({location}); # check existance of location
-      exists({location}, {category}); # check existance of category
-      exists({location}, {category}, {table}); # check existance of table
-
-    or specify the HDF5 path to the table::
+    Return all fields in a data table.
 
-      exists({path_in_hdf5});
+    The fields are read from the schema cached in the manifest. The file is only opened if it was registered without a schema (by an older version of HDFQS).
 
     Parameters
     ----------
-    location : str
-      If :literal:`category` and :literal:`table` are omitted, this location is checked for existance. Alternately, this may instead be a string containing the path in HDF5 to the table (must start with a "/").
-    category : str
-      If :literal:`table` is omitted, this category under the specified location is checked for existance. Omit this parameter if specifying as a path in HDF5 (see :literal:`location` above).
-    table : str
-      Table to check for existance. Omit this parameter if specifying as a path in HDF5 (see :literal:`location` above).
+    path : str
+      HDF5 path to the data table.
 
     Returns
     -------
-    existance : bool
-      True if specified location/category/table exists, False otherwise.
+    fields : list
+      List containing the fields of the data table.
 
     Raises
     ------
-    NonexistantLocationException : :class:`NonexistantLocationException`
-      Specified path, :samp:`/{location}`, :samp:`/{location}/{category}`, or :samp:`/{location}/{category}/{table}` does not exist.
-    """
-
-    try:
-      if ((category is None) and (table is None) and (location[0] == "/")):
-        tokens = location.split("/");
-        location = tokens[1];
-        if (len(tokens) > 2):
-          category = tokens[2];
-        else:
-          category = None;
-        if (len(tokens) > 3):
-          table = tokens[3];
-        else:
-          table = None;
-      try:
-        if (table is not None):
-          temp = self.manifest["ROOT"][location][category][table];
-        elif (category is not None):
-          temp = self.manifest["ROOT"][location][category];
-        else:
-          temp = self.manifest["ROOT"][location];
-        return True;
-      except KeyError:
-        return False;
-    except:
-      raise NonexistantLocationException("Invalid location/category/table: \"%s\", \"%s\", \"%s\"" % ( location, category, table ));
-
-################################################################################
-################################## OPEN FILE ###################################
-################################################################################
-  def open_file(self, filename):
-    """
-    Open HDF5 file to perform write operations to.
-
-    Parameters
-    ----------
-    filename : str
-      Name of file. May be relative to HDFQS root.
+    Exception
+      Specified path does not exist.
     """
 
-    filename = os.path.join(self.path, filename);
-    self.fd = tables.openFile(filename, mode="a");
+    entries = self.query_entries(path, 0, np.Inf);
+    if (len(entries) == 0):
+      raise Exception("Nonexistant path: \"%s\"" % path);
+    elif ("schema" in entries[0]):
+      return list(entries[0]["schema"]["columns"]);
+    else:
+      filename = entries[0]["filename"];
+      with hdf5_lock:
+        fd = tables.openFile(os.path.join(self.path, filename));
+        table = HDFQS.open_table(fd.getNode(path));
+        fields = table.colnames;
+        fd.close();
+      return fields;
 
 ################################################################################
-#################################### WRITE #####################################
+################################## GET SCHEMA ##################################
 ################################################################################
-  def write(self, path, df, tz=None, data=None, cols=None, name="", filters=None, units=None):
+  def get_schema(self, path):
     """
-    Write data into HDFQS data store.
-
-    There are two ways of calling this function, depending on the format of the data to write. To write a Pandas dataframe::
-
-      write({path}, {dataframe});
-
-    Note that the dataframe must have a column named "time" (dtype np.int64) and a column named "tz" (dtype np.int8).
-
-    To write a numpy array::
-
-      write({path}, {time array}, {timezone array}, {data array}, {columns list});
-
-    The dimensions of the array must be:
-
-    +------+------------------+
-    | Name |Dimension         |
-    +======+==================+
-    | time | ( N, )           |
-    +------+------------------+
-    | tz   | ( N, )           |
-    +------+------------------+
-    | data | ( N, P )         |
-    +------+------------------+
-    | cols | list of length P |
-    +------+------------------+
+    Return the schema of a data table, from the manifest.
 
-    where N is the number of datapoints, P is the number of data columns (excluding time and tz).
+    The schema is a dict with the keys :literal:`columns` (list of column names, in order), :literal:`dtypes` (dict of numpy dtype strings), :literal:`units` (the table's :literal:`units` attribute), and :literal:`filters` (dict of the table's compression and checksum settings). See :meth:`table_schema`.
 
-    Note that :meth:`open_file` must have been called previously to specify a file to write to.
+    The schema of the most recent file (the file with the latest start time) is returned. If the schema differs between files, the key :literal:`consistent` is False, and :meth:`get_schema_conflicts` lists the files with a different schema.
 
     Parameters
     ----------
     path : str
-      HDF5 path to data table.
-    df : pd.DataFrame
-      Data to write, including the :literal:`time` and :literal:`tz` columns. Alternately, this can be a :literal:`np.ndarray(dtype=np.int64)` containing the time data.
-    tz : np.ndarray(dtype=np.int8)
-      Timezone values. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
-    data : np.ndarray
-      Data to write. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
-    cols : list
-      Names of the columns in :literal:`data`. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
-    name : str
-      Descriptive name of table (passed to :literal:`tables.createTable`).
-    filters : tables.Filters
-      PyTables filter for the table (passed to :literal:`tables.createTable`).
-    units : dict
-      Units for each of the columns, not including :literal:`time` and :literal:`tz`. The keys are the column names, the values are strings containing the units. Units for :literal:`time` and :literal:`tz` will be added automatically. This will be written to the table's :literal:`units` attribute. If not specified, a dict will be created with units specified for :literal:`time` and :literal:`tz` only.
+      HDF5 path to the data table.
+
+    Returns
+    -------
+    schema : dict
+      Schema of the table, with the additional key :literal:`consistent`.
 
     Raises
     ------
-    NoFileOpenException : :class:`NoFileOpenException`
-      :literal:`write` was called before :meth:`open_file`, or after :meth:`close_file`.
-    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
-      If writing a Pandas DataFrame, must omit :literal:`tz`, :literal:`data`, and :literal:`cols`. If writing numpy arrays, must specify :literal:`tz`, :literal:`data`, and :literal:`cols`.
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path does not exist, or none of its files were registered with a schema (reregister them with :meth:`reregister_all`).
     """
 
-    if (self.fd is None):
-      raise(NoFileOpenException);
-
-    # Generate DataFrame from data
-    if ((tz is not None) and (data is not None) and (cols is not None)):
-      tm = df;
-      df = self.generate_df(tm, tz, data, cols);
-    elif ((tz is not None) or (data is not None) or (cols is not None)):
-      raise InconsistentArgumentsException("Must either pass DataFrame by itself, or pass time, timezone, data, columns");
-    try: # Check if table exists
-      t = self.fd.getNode(path);
-    except tables.exceptions.NoSuchNodeError:
-      # Parse where and name
-      temp = path.rfind("/");
-      where = path[:temp];
-      table_name = path[temp+1:];
-      # Create description
-      descr = HDFQS.create_description(df);
-      # Create table
-      if (filters is None):
-        filters = self.filters;
-      t = self.fd.createTable(where, table_name, descr, name, filters=filters, createparents=True);
-      if (units is None):
-        units = { "time": "ns since the epoch", "tz": "15 min blocks from UTC" };
-      elif (type(units) == dict):
-        units["time"] = "ns since the epoch";
-        units["tz"] = "15 min blocks from UTC";
-      else:
-        raise Exception("units must be a dict");
-      t.attrs["units"] = units;
-    # Add data
-    t.append(df.values.tolist());
-    # Create index
-    if (not t.cols.time.is_indexed):
-      t.cols.time.create_csindex();
-    t.flush();
-
-################################################################################
-################################## CLOSE FILE ##################################
-################################################################################
-  def close_file(self):
-    """
-    Close HDF5 file being used for write operations.
-    """
+    entries = [ entry for entry in self.manifest.get(path, [ ]) if ("schema" in entry) ];
+    if (len(entries) == 0):
+      raise NonexistantLocationException("No schema for path: \"%s\"" % ( path ));
+    latest = max(entries, key=lambda entry: entry["start"]);
+    schema = dict(latest["schema"]);
+    schema["consistent"] = all(entry["schema"] == latest["schema"] for entry in entries);
 
-    if (self.fd is not None):
-      self.fd.close();
-      self.fd = None;
+    return schema;
 
 ################################################################################
-########################## INTERNAL UTILITY FUNCTIONS ##########################
-################################################################################
-
+################################## GET DTYPES ##################################
 ################################################################################
-################################# GET RELPATH ##################################
-  def get_relpath(self, path):
+  def get_dtypes(self, path):
     """
-    Return path relative to HDFQS root.
+    Return the dtypes of the fields of a data table.
 
-    If the path is not within the HDFQS root, then return the path as is.
+    The dtypes are taken from the schema of the most recent file in the manifest (see :meth:`get_schema`). For files registered without a schema, the first file is opened instead; for tables with data only in the append log, the dtype of the log is used.
 
     Parameters
     ----------
     path : str
-      Path of an HDF5 file.
+      HDF5 path to data table.
 
     Returns
     -------
-    relpath : str
-      Path of specified file relative to HDFQS root, or absolute path if not within HDFQS root.
+    dtypes : dict
+      Dict mapping field names to numpy dtypes (empty if the table does not exist).
     """
 
-    if (path.startswith(self.path)):
-      return os.path.relpath(path, self.path);
+    entries = [ entry for entry in self.manifest.get(path, [ ]) if ("schema" in entry) ];
+    if (len(entries) > 0):
+      latest = max(entries, key=lambda entry: entry["start"]);
+      return dict((name, np.dtype(str(x))) for ( name, x ) in latest["schema"]["dtypes"].items());
+
+    entries = self.manifest.get(path, [ ]);
+    if (len(entries) > 0):
+      with hdf5_lock:
+        fd = tables.openFile(os.path.join(self.path, entries[0]["filename"]), mode="r");
+        try:
+          dtype = HDFQS.open_table(fd.getNode(path)).dtype;
+        finally:
+          fd.close();
     else:
-      return path;
+      dtype = self.log_dtype(path);
+      if (dtype is None):
+        return { };
+
+    return dict((name, dtype[name]) for name in dtype.names);
 
 ################################################################################
-#################################### QUERY #####################################
-  def query(self, path, start, stop):
+############################# GET SCHEMA CONFLICTS #############################
+################################################################################
+  def get_schema_conflicts(self, path):
     """
-    Return filenames containing data from the specified table and time range.
+    Return the files whose schema for a data table differs from the schema returned by :meth:`get_schema`.
 
     Parameters
     ----------
     path : str
-      HDF5 path to data table.
-    start : int64
-      Start of time range, in ns since the epoch.
-    stop : int64
-      End of time range, in ns since the epoch.
+      HDF5 path to the data table.
 
     Returns
     -------
     files : list
-      List of filenames which contain the specified data in the specified time range.
+      List of filenames with a different schema (empty if the schema is consistent).
     """
 
-    files = [ ];
-    for entry in self.manifest[path]:
-      if ((entry["start"] <= stop) and (entry["stop"] >= start)):
-        files.append(entry["filename"]);
-
-    return files;
+    schema = self.get_schema(path);
+    del schema["consistent"];
+    return [ entry["filename"] for entry in self.manifest[path] if (("schema" in entry) and (entry["schema"] != schema)) ];
 
 ################################################################################
-################################# GENERATE DF ##################################
-  def generate_df(self, tm, tz, data, cols):
+################################### SANITIZE ###################################
+################################################################################
+  def sanitize(self, filename, min_time=31536000000000000L, index=True):
     """
-    Generate a Pandas DataFrame from numpy arrays.
+    Sanitize all tables in specified file.
 
-    See table under :meth:`write` for a summary of the required shape of the various numpy arrays.
+    For each table in the file, this function removes all data entries with an invalid time (any time before the specified minimum time), and optionally adds a completely-sorted index on the time column (to speed up loading data). Encoded tables (see :class:`EncodedTable`) are re-encoded without the invalid rows, and are not indexed. Tables which are rewritten to remove invalid rows get a new chunk layout (see :meth:`table_layout`).
 
     Parameters
     ----------
-    tm : np.ndarray(dtype=np.int64)
-      Time data. Shape must be ( N, ), where N is the number of data points.
-    tz : np.ndarray(dtype=np.int8)
-      Timezone values. Shape must be ( N, ), where N is the number of data points.
-    data : np.ndarray
-      Data to write. Shape must be ( N, P ), where N is the number of data points, P is the number of data columns.
-    cols : list
-      Names of the columns in :literal:`data`. Must have length P, where P is the number of data columns (excluding time and timezone).
-
-    Returns
-    -------
-    df : pd.DataFrame
-      Pandas DataFrame containing the data.
-
-    Raises
-    ------
-    InconsistentDimensionsException : :class:`InconsistentDimensionsException`
-      Dimensions of :literal:`time`, :literal:`tz`, :literal:`data`, and/or :literal:`cols` are not consistent. See Parameters above, or summary table under :meth:`write`.
+    filename : str
+      Name of HDF5 file (absolute or relative to HDFQS root).
+    min_time : int64
+      Earliest valid time, in ns since the epoch (default is 1/1/1971 00:00:00 UTC).
+    index : bool
+      Whether or not to create a completely-sorted index on the time column (default is True).
     """
 
-    # Check consistency of dimensions
+    filename = os.path.join(self.path, filename);
+    with hdf5_lock:
+      fd = tables.openFile(filename, mode="a");
+      print filename;
+
+      g = fd.root;
+      for loc in g._v_children.items():
+        loc = loc[1];
+        for cat in loc._v_children.items():
+          cat = cat[1];
+          for t in cat._v_children.items():
+            t = t[1];
+            if (not isinstance(t, tables.Table)):
+              t = HDFQS.open_table(t);
+              if (t is not None):
+                self.sanitize_encoded(cat, t, min_time);
+              continue;
+
+            # Check if table is empty
+            if (t.shape == ( 0, )):
+              print "0%s" % ( t.name );
+              continue;
+
+            # Check for time before minimum
+            bad_rows = t.read_where("time < min_time", { "min_time": min_time });
+            if (bad_rows.shape[0] > 0):
+              x = "-%s,%d" % ( t.name, t.shape[0] );
+              tname = t.name;
+              layout = self.table_layout(t._v_pathname, t.read(0, min(t.nrowsinbuf, t.nrows))["time"], t.nrows - bad_rows.shape[0]);
+              tnew = fd.createTable(cat, "%s_new" % ( tname ), t.description, t.title, filters=t.filters, **layout);
+              t.attrs._f_copy(tnew);
+              t.append_where(tnew, "time >= min_time", { "min_time": min_time });
+              tnew.flush();
+              t.remove();
+              tnew.move(None, tname);
+              x = "%s,%d,%d" % ( x, tnew.shape[0], bad_rows.shape[0] );
+              print x;
+              t = tnew;
+
+            # Check if table is empty
+            if (t.shape == ( 0, )):
+              print "0%s" % ( t.name );
+              continue;
+
+            # Check for existance of time index
+            if (index and (not t.cols.time.is_indexed)):
+              print "*%s" % ( t.name );
+              t.cols.time.create_csindex();
+
+      fd.close();
+
+################################################################################
+############################### SANITIZE ENCODED ###############################
+################################################################################
+  def sanitize_encoded(self, group, t, min_time):
+    """
+    Remove all rows with an invalid time from an encoded table (see :meth:`sanitize`).
+
+    If the table contains invalid rows, the valid rows are encoded into a new table, which replaces the old table.
+
+    Parameters
+    ----------
+    group : tables.Group
+      Group (category) containing the table.
+    t : :class:`EncodedTable`
+      Table to sanitize.
+    min_time : int64
+      Earliest valid time, in ns since the epoch.
+    """
+
+    if (t.shape == ( 0, )):
+      print "0%s" % ( t.name );
+      return;
+
+    bad_rows = t.read_where("time < min_time", { "min_time": min_time });
+    if (bad_rows.shape[0] == 0):
+      return;
+    x = "-%s,%d" % ( t.name, t.shape[0] );
+    tname = t.name;
+    layout = self.table_layout(t.group._v_pathname, t.read(0, min(t.nrowsinbuf, t.nrows))["time"], t.nrows - bad_rows.shape[0]);
+    tnew = EncodedTable.create(group._v_file, group._v_pathname, "%s_new" % ( tname ), t.encoding, t.group._v_title, t.filters, **layout);
+    t.attrs._f_copy(tnew.group);
+    step = max(t.nrowsinbuf, 1);
+    for i in range(0, t.nrows, step):
+      rows = t.read(i, min(i + step, t.nrows));
+      tnew.append(rows[rows["time"] >= min_time]);
+    tnew.flush();
+    t.group._f_remove(recursive=True);
+    tnew.group._f_rename(tname);
+    print "%s,%d,%d" % ( x, tnew.shape[0], bad_rows.shape[0] );
+    if (tnew.shape == ( 0, )):
+      print "0%s" % ( tname );
+
+################################################################################
+############################## SANITIZE DIRECTORY ##############################
+################################################################################
+  def sanitize_directory(self, path, no_links=False, min_time=31536000000000000L, index=True):
+    """
+    Sanitize all files in the specified directory.
+    
+    Run :meth:`sanitize` on all HDF5 files in the specified directory, recursing through all subdirectories. Links may be optionally ignored, for use with git annex. In this case, all files added into git annex can be assumed to be sanitized, while files not yet added (or which have been unlocked) will be sanitized.
+
+    Parameters
+    ----------
+    path : str
+      Path of directory to sanitize.
+    no_links : bool
+      Whether or not to ignore symlinks (default is False).
+    min_time : int64
+      Earliest valid time, in ns since the epoch (default is 1/1/1971 00:00:00 UTC).
+    index : bool
+      Whether or not to create a completed-sorted index on the time column (Default is False).
+
+    Raises
+    ------
+    OSError
+      Specified path does not exist.
+    """
+
+    path = os.path.join(self.path, path);
+    if (not os.path.exists(path)):
+      raise OSError("Invalid path - \"%s\"" % ( path ));
+    for filename in os.listdir(path):
+      if ((filename == ".git") or (filename == "raw") or (filename == "log")):
+        continue;
+
+      full_path = os.path.join(path, filename);
+      if (os.path.isdir(full_path)):
+        self.sanitize_directory(full_path, min_time=min_time, index=index);
+      elif (no_links and os.path.islink(full_path)):
+        continue;
+      elif (filename[-3:] == ".h5"):
+        self.sanitize(full_path, min_time=min_time, index=index);
+
+################################################################################
+#################################### REPACK ####################################
+################################################################################
+  def repack(self, filename, paths=None):
+    """
+    Rewrite the tables in a file with the chunk layout chosen by :meth:`table_layout`.
+
+    Each table is copied to a new table with the new layout (with the same description, filters, and attributes), and the new table replaces the old one. Encoded tables (see :class:`EncodedTable`) are not repacked. The data is not changed, so the file does not need to be registered again.
+
+    Parameters
+    ----------
+    filename : str
+      Name of HDF5 file (absolute or relative to HDFQS root).
+    paths : list
+      HDF5 paths of the tables to repack (default is None - repack all tables in the file).
+    """
+
+    filename = os.path.join(self.path, filename);
+    with hdf5_lock:
+      fd = tables.openFile(filename, mode="a");
+      print filename;
+
+      for loc in fd.root._v_children.values():
+        for cat in loc._v_children.values():
+          for t in cat._v_children.values():
+            if ((not isinstance(t, tables.Table)) or (t.shape == ( 0, ))):
+              continue;
+            if ((paths is not None) and (t._v_pathname not in paths)):
+              continue;
+
+            tname = t.name;
+            layout = self.table_layout(t._v_pathname, t.read(0, min(t.nrowsinbuf, t.nrows))["time"], t.nrows);
+            tnew = fd.createTable(cat, "%s_new" % ( tname ), t.description, t.title, filters=t.filters, **layout);
+            t.attrs._f_copy(tnew);
+            step = max(t.nrowsinbuf, 1);
+            for i in range(0, t.nrows, step):
+              tnew.append(t.read(i, min(i + step, t.nrows)));
+            tnew.flush();
+            indexed = t.cols.time.is_indexed;
+            print "%s,%d,%d" % ( tname, t.chunkshape[0], tnew.chunkshape[0] );
+            t.remove();
+            tnew.move(None, tname);
+            if (indexed):
+              tnew.cols.time.create_csindex();
+
+      fd.close();
+
+################################################################################
+#################################### VERIFY ####################################
+################################################################################
+  def verify(self, path="", workers=1):
+    """
+    Verify the integrity of all registered files in the specified directory.
+
+    Every table in every file is read in full, in blocks, so the HDF5 library checks the checksum of every chunk (tables are written with :literal:`fletcher32=True`). The number of rows and the time range of each table are also compared with the manifest. Files are verified in parallel by separate processes. The names of bad files are printed as they are found.
+
+    Parameters
+    ----------
+    path : str
+      Path of directory to verify (default is the HDFQS root). Path can be relative to HDFQS root.
+    workers : int
+      Number of worker processes (default is 1 - verify in this process).
+
+    Returns
+    -------
+    report : dict
+      Dict with the keys :literal:`files` (number of files verified), :literal:`bytes` (total size of the files), :literal:`seconds` (time taken), :literal:`throughput` (bytes per second), and :literal:`bad_files` (dict mapping the name of each bad file to a list of error messages).
+    """
+
+    prefix = self.get_relpath(os.path.join(self.path, path));
+    if (prefix == "."):
+      prefix = "";
+    manifest = dict(self.manifest.items());
+    tasks = [ ];
+    for relpath in sorted(manifest["FILES"].keys()):
+      if ((prefix != "") and (not relpath.startswith(prefix.rstrip("/") + "/"))):
+        continue;
+      expected = { };
+      for ( key, entries ) in manifest.items():
+        if (key.startswith("/")):
+          for entry in entries:
+            if (entry["filename"] == relpath):
+              expected[key] = entry;
+      tasks.append(( self.path, relpath, expected ));
+
+    report = { "files": len(tasks), "bytes": 0, "bad_files": { } };
+    start_time = time.time();
+    if (workers > 1):
+      pool = multiprocessing.Pool(workers);
+      try:
+        results = pool.imap_unordered(verify_file, tasks);
+        for ( relpath, size, errors ) in results:
+          HDFQS.add_verify_result(report, relpath, size, errors);
+      finally:
+        pool.close();
+        pool.join();
+    else:
+      for task in tasks:
+        ( relpath, size, errors ) = verify_file(task);
+        HDFQS.add_verify_result(report, relpath, size, errors);
+    report["seconds"] = time.time() - start_time;
+    report["throughput"] = report["bytes"] / report["seconds"] if (report["seconds"] > 0) else 0.0;
+
+    return report;
+
+################################################################################
+################################ GET LOCATIONS #################################
+################################################################################
+  def get_locations(self):
+    """
+    Return all locations within HDFQS data store.
+  
+    Returns
+    -------
+    locations : list
+      List containing all locations within HDFQS data store.
+    """
+
+    return self.manifest["ROOT"].keys();
+
+################################################################################
+################################ GET CATEGORIES ################################
+################################################################################
+  def get_categories(self, location):
+    """
+    Return all categories within specified location
+
+    There are two ways to call this function. Either specify the location::
+
+      get_categories({location});
+
+    or specify the HDF5 path to the location::
+
+      get_categories({path_in_hdf5});
+
+    Parameters
+    ----------
+    location : str
+      Location under which to search for categories. This may instead be a string containing the path in HDF5 to the location (must start with a "/").
+
+    Returns
+    -------
+    categories : str
+      List containing all categories within the specified location.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path or :samp:`/{location}` does not exist.
+    """
+
+    try:
+      if (location[0] == "/"):
+        location = location[1:];
+      return self.manifest["ROOT"][location].keys();
+    except:
+      raise NonexistantLocationException("Invalid location \"%s\"" % ( location ));
+
+################################################################################
+################################## GET TABLES ##################################
+################################################################################
+  def get_tables(self, location, category=None):
+    """
+    Return all tables within specified category
+
+    There are two ways to call this function. Either specify the location and category separately::
+
+      get_tables({location}, {category});
+
+    or specify the HDF5 path to the category::
+
+      get_tables({path_in_hdf5});
+
+    Parameters
+    ----------
+    location : str
+      Location containing the specified category. This may instead be a string containing the path in HDF5 to the category (must start with a "/").
+    category : str
+      Category under which to search for tables. Omit this parameter if specifying the category as a path in HDF5 (see :literal:`location` above).
+
+    Returns
+    -------
+    tables : str
+      List containing all tables within the specified location.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path or :samp:`/{location}/{category}` does not exist.
+    """
+
+    try:
+      if (category is None):
+        x = re.match("/(.+)/(.+)", location);
+        location = x.group(1);
+        category = x.group(2);
+      return self.manifest["ROOT"][location][category].keys();
+    except:
+      raise NonexistantLocationException("Invalid location/category: \"%s\", \"%s\"" % ( location, category ));
+
+################################################################################
+################################ GET TIME RANGE ################################
+################################################################################
+  def get_time_range(self, location, category=None, table=None):
+    """
+    Return the minimum and maximum time of data in the specified table.
+
+    There are two ways to call this function. Either specify the location, category, and table separately::
+
+      get_time_range({location}, {category}, {table});
+
+    or specify the HDF5 path to the table::
+
+      get_time_range({path_in_hdf5});
+
+    Parameters
+    ----------
+    location : str
+      Location containing the specified category. This may instead be a string containing the path in HDF5 to the table (must start with a "/").
+    category : str
+      Category containing the specified table. Omit this parameter if specifying the table as a path in HDF5 (see :literal:`location` above).
+    table : str
+      Table to query for minimum and maximum time of data. Omit this parameter if specifying the table as a path in HDF5 (see :literal:`location` above).
+
+    Returns
+    -------
+    time_range : list
+      List containing minuimum time as element 0, maximum time as element 1.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path or :samp:`/{location}/{category}/{table}` does not exist.
+    """
+
+    try:
+      if ((category is None) and (table is None)):
+        x = re.match("/(.+)/(.+)/(.+)", location);
+        location = x.group(1);
+        category = x.group(2);
+        table = x.group(3);
+      return self.manifest["ROOT"][location][category][table];
+    except:
+      raise NonexistantLocationException("Invalid location/category/table: \"%s\", \"%s\", \"%s\"" % ( location, category, table ));
+
+################################################################################
+#################################### EXISTS ####################################
+################################################################################
+  def exists(self, location, category=None, table=None):
+    """
+    Check if a specified location/category/table exists.
+
+    There are two ways to call this function. Either specify the location, category, and table separately::
+
+      exists({location}); # check existance of location
+      exists({location}, {category}); # check existance of category
+      exists({location}, {category}, {table}); # check existance of table
+
+    or specify the HDF5 path to the table::
+
+      exists({path_in_hdf5});
+
+    Parameters
+    ----------
+    location : str
+      If :literal:`category` and :literal:`table` are omitted, this location is checked for existance. Alternately, this may instead be a string containing the path in HDF5 to the table (must start with a "/").
+    category : str
+      If :literal:`table` is omitted, this category under the specified location is checked for existance. Omit this parameter if specifying as a path in HDF5 (see :literal:`location` above).
+    table : str
+      Table to check for existance. Omit this parameter if specifying as a path in HDF5 (see :literal:`location` above).
+
+    Returns
+    -------
+    existance : bool
+      True if specified location/category/table exists, False otherwise.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path, :samp:`/{location}`, :samp:`/{location}/{category}`, or :samp:`/{location}/{category}/{table}` does not exist.
+    """
+
+    try:
+      if ((category is None) and (table is None) and (location[0] == "/")):
+        tokens = location.split("/");
+        location = tokens[1];
+        if (len(tokens) > 2):
+          category = tokens[2];
+        else:
+          category = None;
+        if (len(tokens) > 3):
+          table = tokens[3];
+        else:
+          table = None;
+      try:
+        if (table is not None):
+          temp = self.manifest["ROOT"][location][category][table];
+        elif (category is not None):
+          temp = self.manifest["ROOT"][location][category];
+        else:
+          temp = self.manifest["ROOT"][location];
+        return True;
+      except KeyError:
+        return False;
+    except:
+      raise NonexistantLocationException("Invalid location/category/table: \"%s\", \"%s\", \"%s\"" % ( location, category, table ));
+
+################################################################################
+################################## OPEN FILE ###################################
+################################################################################
+  def open_file(self, filename):
+    """
+    Open HDF5 file to perform write operations to.
+
+    Parameters
+    ----------
+    filename : str
+      Name of file. May be relative to HDFQS root.
+    """
+
+    filename = os.path.join(self.path, filename);
+    with hdf5_lock:
+      self.fd = tables.openFile(filename, mode="a");
+
+################################################################################
+#################################### WRITE #####################################
+################################################################################
+  def write(self, path, df, tz=None, data=None, cols=None, name="", filters=None, units=None, encoding=None):
+    """
+    Write data into HDFQS data store.
+
+    There are two ways of calling this function, depending on the format of the data to write. To write a Pandas dataframe::
+
+      write({path}, {dataframe});
+
+    Note that the dataframe must have a column named "time" (dtype np.int64) and a column named "tz" (dtype np.int8).
+
+    To write a numpy array::
+
+      write({path}, {time array}, {timezone array}, {data array}, {columns list});
+
+    The dimensions of the array must be:
+
+    +------+------------------+
+    | Name |Dimension         |
+    +======+==================+
+    | time | ( N, )           |
+    +------+------------------+
+    | tz   | ( N, )           |
+    +------+------------------+
+    | data | ( N, P )         |
+    +------+------------------+
+    | cols | list of length P |
+    +------+------------------+
+
+    where N is the number of datapoints, P is the number of data columns (excluding time and tz).
+
+    New tables are created with a chunk layout chosen from the sampling rate of the data (see :meth:`table_layout`).
+
+    Event tables (tables with only the :literal:`time` and :literal:`tz` columns) can optionally be stored in a compact encoding (see :class:`EncodedTable`), by passing :literal:`encoding` when the table is created. Encoded tables are read transparently by :meth:`register`, :meth:`load`, and the other query functions, and data written to an existing encoded table is encoded the same way.
+
+    Note that :meth:`open_file` must have been called previously to specify a file to write to.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    df : pd.DataFrame
+      Data to write, including the :literal:`time` and :literal:`tz` columns. Alternately, this can be a :literal:`np.ndarray(dtype=np.int64)` containing the time data.
+    tz : np.ndarray(dtype=np.int8)
+      Timezone values. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
+    data : np.ndarray
+      Data to write. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
+    cols : list
+      Names of the columns in :literal:`data`. Omit this parameter if writing a Pandas DataFrame (see :literal:`df` above).
+    name : str
+      Descriptive name of table (passed to :literal:`tables.createTable`).
+    filters : tables.Filters
+      PyTables filter for the table (passed to :literal:`tables.createTable`).
+    units : dict
+      Units for each of the columns, not including :literal:`time` and :literal:`tz`. The keys are the column names, the values are strings containing the units. Units for :literal:`time` and :literal:`tz` will be added automatically. This will be written to the table's :literal:`units` attribute. If not specified, a dict will be created with units specified for :literal:`time` and :literal:`tz` only.
+    encoding : str
+      Encoding of a new event table: "delta" (time stored as differences between rows), "delta2" (time stored as differences of differences, for events at a regular rate), or None (default - store as a regular table). Ignored if the table already exists.
+
+    Raises
+    ------
+    NoFileOpenException : :class:`NoFileOpenException`
+      :literal:`write` was called before :meth:`open_file`, or after :meth:`close_file`.
+    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
+      If writing a Pandas DataFrame, must omit :literal:`tz`, :literal:`data`, and :literal:`cols`. If writing numpy arrays, must specify :literal:`tz`, :literal:`data`, and :literal:`cols`. :literal:`encoding` can only be used for tables with only the :literal:`time` and :literal:`tz` columns.
+    """
+
+    if (self.fd is None):
+      raise(NoFileOpenException);
+
+    # Generate DataFrame from data
+    if ((tz is not None) and (data is not None) and (cols is not None)):
+      tm = df;
+      df = self.generate_df(tm, tz, data, cols);
+    elif ((tz is not None) or (data is not None) or (cols is not None)):
+      raise InconsistentArgumentsException("Must either pass DataFrame by itself, or pass time, timezone, data, columns");
+    with hdf5_lock:
+      try: # Check if table exists
+        t = HDFQS.open_table(self.fd.getNode(path));
+      except tables.exceptions.NoSuchNodeError:
+        # Parse where and name
+        temp = path.rfind("/");
+        where = path[:temp];
+        table_name = path[temp+1:];
+        # Create description
+        descr = HDFQS.create_description(df);
+        # Create table
+        if (filters is None):
+          filters = self.filters;
+        layout = self.table_layout(path, df["time"].values, len(df));
+        if (encoding is None):
+          t = self.fd.createTable(where, table_name, descr, name, filters=filters, createparents=True, **layout);
+        elif (list(df.columns) != [ "time", "tz" ]):
+          raise InconsistentArgumentsException("Only tables with time and tz columns can be encoded");
+        else:
+          t = EncodedTable.create(self.fd, where, table_name, encoding, name, filters, **layout);
+        if (units is None):
+          units = { "time": "ns since the epoch", "tz": "15 min blocks from UTC" };
+        elif (type(units) == dict):
+          units["time"] = "ns since the epoch";
+          units["tz"] = "15 min blocks from UTC";
+        else:
+          raise Exception("units must be a dict");
+        t.attrs["units"] = units;
+      # Add data (column by column, so int64 times are not converted to float)
+      rows = np.empty(len(df), dtype=t.dtype);
+      for i in range(len(t.colnames)):
+        rows[t.colnames[i]] = df[df.columns[i]].values;
+      t.append(rows);
+      # Create index
+      if ((isinstance(t, tables.Table)) and (not t.cols.time.is_indexed)):
+        t.cols.time.create_csindex();
+      t.flush();
+
+################################################################################
+################################## IMPORT CSV ##################################
+################################################################################
+  def import_csv(self, filename, path, time_field="time", time_unit=None, time_format=None, local_time=False, tz=0, tz_field=None, fields=None, chunksize=100000, name="", units=None, csv_args=None):
+    """
+    Import a CSV file into a table, reading it in chunks.
+
+    Each chunk of :literal:`chunksize` rows is converted and appended to the table with :meth:`write`, so memory use does not depend on the size of the CSV file. Time is converted to ns since the epoch, and timezone to 15 minute blocks from UTC, for the whole chunk at once.
+
+    The time column can either contain numbers (time since the epoch, in units of :literal:`time_unit`), or date/time strings (parsed with :literal:`time_format` if given). Date/time strings containing a UTC offset are converted to UTC. Times without an offset are assumed to be UTC, unless :literal:`local_time` is True, in which case they are converted from the timezone given by :literal:`tz` or :literal:`tz_field`.
+
+    Note that :meth:`open_file` must have been called previously to specify a file to write to. The file is not registered; see :meth:`import_files` to import several files and register them.
+
+    Parameters
+    ----------
+    filename : str
+      Path of CSV file. May be relative to HDFQS root.
+    path : str
+      HDF5 path to data table.
+    time_field : str
+      Name of the time column in the CSV file (default is "time").
+    time_unit : str
+      Unit of numeric times, one of "s", "ms", "us", "ns" (default is None - times are date/time strings).
+    time_format : str
+      :literal:`strftime` format of date/time strings (default is None - format is inferred).
+    local_time : bool
+      Whether times without a UTC offset are local times in the timezone of the data (default is False).
+    tz : int
+      Timezone of all data, as the number of 15 minute blocks west of UTC (default is 0). Ignored if :literal:`tz_field` is given.
+    tz_field : str
+      Name of a column in the CSV file containing the UTC offset of each row, in minutes (e.g. -300 for UTC-5).
+    fields : dict
+      Columns to import. The keys are CSV column names, the values are the table column names (default is all columns except the time and timezone columns, with the same names).
+    chunksize : int
+      Number of rows to read and append at a time (default is 100000).
+    name : str
+      Descriptive name of table (passed to :meth:`write`).
+    units : dict
+      Units for each of the table columns (passed to :meth:`write`).
+    csv_args : dict
+      Additional arguments passed to :literal:`pd.read_csv` (e.g. :literal:`sep`).
+
+    Returns
+    -------
+    nrows : int
+      Number of rows imported.
+
+    Raises
+    ------
+    NoFileOpenException : :class:`NoFileOpenException`
+      :literal:`import_csv` was called before :meth:`open_file`, or after :meth:`close_file`.
+    """
+
+    if (self.fd is None):
+      raise(NoFileOpenException);
+    if (csv_args is None):
+      csv_args = { };
+
+    filename = os.path.join(self.path, filename);
+    nrows = 0;
+    for chunk in pd.read_csv(filename, chunksize=chunksize, **csv_args):
+      if (fields is None):
+        fields = dict((x, x) for x in chunk.columns if ((x != time_field) and (x != tz_field)));
+      # Convert timezone
+      if (tz_field is not None):
+        tz_blocks = np.round(-chunk[tz_field].values / 15.0).astype(np.int8);
+      else:
+        tz_blocks = np.repeat(np.int8(tz), len(chunk));
+      # Convert time
+      if (time_unit is not None):
+        tm = pd.to_datetime(chunk[time_field], unit=time_unit).values.astype(np.int64);
+      else:
+        tm = pd.to_datetime(chunk[time_field], format=time_format, utc=True).values.astype(np.int64);
+      if (local_time):
+        tm = tm + tz_blocks.astype(np.int64) * 900000000000;
+
+      df = pd.DataFrame();
+      df["time"] = tm;
+      df["tz"] = tz_blocks;
+      for x in sorted(fields.keys(), key=lambda x: chunk.columns.get_loc(x)):
+        df[fields[x]] = chunk[x].values;
+      self.write(path, df, name=name, units=units);
+      nrows = nrows + len(df);
+
+    return nrows;
+
+################################################################################
+################################# IMPORT FILES #################################
+################################################################################
+  def import_files(self, jobs, workers=1):
+    """
+    Import several CSV files in parallel, and register the files written.
+
+    Each job is a dict with the keys :literal:`filename` (CSV file), :literal:`dest` (HDF5 file to write to, relative to HDFQS root), and :literal:`path` (HDF5 path to data table), and optionally any other arguments of :meth:`import_csv`. For example::
+
+      import_files([ { "filename": "raw/hr_2015.csv", "dest": "2015/hr.h5", "path": "/self/Health/hr", "time_unit": "s" } ], workers=4);
+
+    Jobs writing to the same HDF5 file are run in order by the same worker process, since an HDF5 file cannot be written by several processes at once. When all jobs are done, all files written are registered (or re-registered, if they were already registered), and the manifest is written once.
+
+    Parameters
+    ----------
+    jobs : list
+      List of import jobs (dicts, see above).
+    workers : int
+      Number of worker processes (default is 1 - import in this process).
+
+    Returns
+    -------
+    nrows : int
+      Total number of rows imported.
+    """
+
+    by_dest = { };
+    for job in jobs:
+      by_dest.setdefault(job["dest"], [ ]).append(job);
+    tasks = [ ( self.path, dest, dest_jobs ) for ( dest, dest_jobs ) in by_dest.items() ];
+
+    if (workers > 1):
+      pool = multiprocessing.Pool(workers);
+      try:
+        counts = pool.map(run_import_jobs, tasks);
+      finally:
+        pool.close();
+        pool.join();
+    else:
+      counts = [ run_import_jobs(task) for task in tasks ];
+
+    with self.manifest_lock:
+      for dest in by_dest.keys():
+        self.unregister(dest, write_manifest=False);
+        self.register(dest, write_manifest=False);
+      self.write_manifest();
+
+    return sum(counts);
+
+################################################################################
+#################################### APPEND ####################################
+################################################################################
+  def append(self, path, df):
+    """
+    Append data to the append log of a table.
+
+    The append log is a low-latency alternative to :meth:`write` for data arriving in many small batches. Each table has its own log file in the :literal:`log` directory of the HDFQS root, containing the rows as fixed-size binary records (with the dtype saved in a :literal:`.dtype` file next to it). Appending a batch is a single write to the end of the log. The data is visible to :meth:`load` and :meth:`iter_chunks` (and :meth:`read_log`) immediately, and is moved into an HDF5 file by :meth:`compact`.
+
+    When the log is compacted, its rows move from the log to a newly written HDF5 file. HDFQS objects in other processes only see that file once they register it, so readers in other processes should run :meth:`start_watcher` (with a short interval), or compacted rows are missing from their results until the file is registered.
+
+    Several processes may append to the same log at the same time (where :literal:`fcntl` is available).
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    df : pd.DataFrame
+      Data to append, including the :literal:`time` and :literal:`tz` columns (see :meth:`write`). If the log already exists, the columns are converted to the dtypes of the log.
+    """
+
+    filename = self.log_path(path);
+    if (not os.path.isdir(os.path.dirname(filename))):
+      os.makedirs(os.path.dirname(filename));
+    dtype = self.log_dtype(path);
+    if (dtype is None):
+      dtype = np.dtype([ ( str(x), df[x].dtype ) for x in df.columns ]);
+      HDFQS.write_atomic(filename[:-4] + ".dtype", json.dumps([ [ x, dtype[x].str ] for x in dtype.names ]));
+    rows = np.empty(len(df), dtype=dtype);
+    for x in dtype.names:
+      rows[x] = df[x].values;
+
+    while (True):
+      fd = open(filename, "ab");
+      if (fcntl is not None):
+        fcntl.flock(fd.fileno(), fcntl.LOCK_EX);
+      try: # reopen if the log was moved by compact while waiting for the lock
+        if (os.fstat(fd.fileno()).st_ino == os.stat(filename).st_ino):
+          fd.write(rows.tostring());
+          fd.flush();
+          return;
+      except OSError:
+        pass;
+      finally:
+        fd.close(); # releases the lock
+
+################################################################################
+################################### COMPACT ####################################
+################################################################################
+  def compact(self, dest, path=None):
+    """
+    Move the data in append logs into an HDF5 file.
+
+    Each log is renamed (with the suffix :literal:`.compacting`) so new appends start a new log, its rows are written to the table in :literal:`dest` with :meth:`write` (using the chunk layout settings of this object), the file is registered, and the renamed log is deleted. Readers see the renamed log until it is deleted (see :meth:`append` for readers in other processes).
+
+    Compaction can safely be repeated after it is interrupted. When a log is renamed, an ID and the destination file are recorded next to it (with the suffix :literal:`.compacting.dest`), and the number of rows in the table is added to this record just before the rows are appended. The ID is saved in the :literal:`hdfqs_log_id` attribute of the table after the rows are written (and in the manifest entry when the file is registered). If a previous compaction was interrupted, the remaining renamed log is compacted first, to its recorded destination: its rows are not written again if the table already has its ID, and otherwise the table is truncated to the recorded number of rows (removing any rows appended before the interruption) before they are written.
+
+:meth:`read_log` skips a renamed log whose ID is in the manifest, so rows are not loaded twice between registering the file and deleting the log.
+
+    Parameters
+    ----------
+    dest : str
+      HDF5 file to write to (may be relative to HDFQS root). :literal:`time.strftime` codes are replaced with the current time (e.g. "%Y/live_%Y%m%d.h5").
+    path : str
+      HDF5 path of the table whose log to compact (default is None - compact all logs).
+
+    Returns
+    -------
+    nrows : int
+      Number of rows written to HDF5 files.
+    """
+
+    log_dir = os.path.join(self.path, "log");
+    if (path is not None):
+      paths = [ path ];
+    elif (os.path.isdir(log_dir)):
+      paths = [ "/" + x[:-6].replace(".", "/") for x in os.listdir(log_dir) if (x.endswith(".dtype")) ];
+    else:
+      paths = [ ];
+    dest = time.strftime(dest);
+
+    writer = HDFQS(self.path, register=False, file_duration=self.file_duration, layouts=self.layouts);
+    nrows = 0;
+    dests = set();
+    compacted = [ ];
+    for path in paths:
+      filename = self.log_path(path);
+      if ((not os.path.exists(filename + ".compacting")) and (os.path.exists(filename))):
+        if (os.path.exists(filename + ".compacting.dest")): # left over from a finished compaction
+          os.remove(filename + ".compacting.dest");
+        fd = open(filename, "ab");
+        if (fcntl is not None):
+          fcntl.flock(fd.fileno(), fcntl.LOCK_EX);
+        try:
+          os.rename(filename, filename + ".compacting");
+        finally:
+          fd.close();
+      if (not os.path.exists(filename + ".compacting")):
+        continue;
+
+      # Record the ID and destination of the renamed log, so it is only written once
+      if (not os.path.exists(filename + ".compacting.dest")):
+        log_id = "%x-%x" % ( int(time.time() * 1e6), os.getpid() );
+        HDFQS.write_atomic(filename + ".compacting.dest", json.dumps({ "id": log_id, "dest": dest }));
+      fd = open(filename + ".compacting.dest", "r");
+      record = json.load(fd);
+      fd.close();
+      log_id = str(record["id"]);
+      target = str(record["dest"]);
+
+      rows = np.fromfile(filename + ".compacting", dtype=self.log_dtype(path));
+      if (len(rows) > 0):
+        if (not os.path.isdir(os.path.dirname(os.path.join(self.path, target)))):
+          os.makedirs(os.path.dirname(os.path.join(self.path, target)));
+        with hdf5_lock:
+          writer.open_file(target);
+          try:
+            try:
+              t = HDFQS.open_table(writer.fd.getNode(path));
+            except tables.exceptions.NoSuchNodeError:
+              t = None;
+            if ((t is None) or ("hdfqs_log_id" not in t.attrs._v_attrnames) or (t.attrs["hdfqs_log_id"] != log_id)):
+              if ("nrows" not in record):
+                record["nrows"] = 0 if (t is None) else t.nrows;
+                HDFQS.write_atomic(filename + ".compacting.dest", json.dumps(record));
+              elif ((t is not None) and (t.nrows > record["nrows"])): # interrupted after appending
+                if ((isinstance(t, tables.Table)) and (t.cols.time.is_indexed)): # rebuilt by write
+                  t.cols.time.remove_index();
+                t.truncate(record["nrows"]);
+              writer.write(path, pd.DataFrame(rows));
+              HDFQS.open_table(writer.fd.getNode(path)).attrs["hdfqs_log_id"] = log_id;
+              nrows = nrows + len(rows);
+          finally:
+            writer.close_file();
+        dests.add(target);
+      compacted.append(filename);
+
+    with self.manifest_lock:
+      if (len(dests) > 0):
+        for target in dests:
+          self.unregister(target, write_manifest=False);
+          self.register(target, write_manifest=False);
+        self.write_manifest();
+      for filename in compacted:
+        os.remove(filename + ".compacting");
+        os.remove(filename + ".compacting.dest");
+
+    return nrows;
+
+################################################################################
+############################### START COMPACTOR ################################
+################################################################################
+  def start_compactor(self, dest, interval=60):
+    """
+    Start a background thread which runs :meth:`compact` on all append logs every :literal:`interval` seconds.
+
+    As for :meth:`start_watcher`, HDF5 files are only accessed under the module-level HDF5 lock, so compaction does not run PyTables calls concurrently with loads in other threads.
+
+    Parameters
+    ----------
+    dest : str
+      HDF5 file to write to (see :meth:`compact`).
+    interval : float
+      Time between compactions, in seconds (default is 60).
+    """
+
+    if (self.compactor is not None):
+      return;
+
+    stop_event = threading.Event();
+    def run():
+      while (not stop_event.wait(interval)):
+        try:
+          self.compact(dest);
+        except Exception as e: # keep running; the next compaction retries
+          print "Error compacting append logs: %s" % ( e );
+    self.compactor_stop = stop_event;
+    self.compactor = threading.Thread(target=run, name="hdfqs-compactor");
+    self.compactor.daemon = True;
+    self.compactor.start();
+
+################################################################################
+################################ STOP COMPACTOR ################################
+################################################################################
+  def stop_compactor(self):
+    """
+    Stop the background thread started by :meth:`start_compactor`.
+    """
+
+    if (self.compactor is None):
+      return;
+
+    self.compactor_stop.set();
+    self.compactor.join();
+    self.compactor = None;
+    self.compactor_stop = None;
+
+################################################################################
+################################## CLOSE FILE ##################################
+################################################################################
+  def close_file(self):
+    """
+    Close HDF5 file being used for write operations.
+    """
+
+    with hdf5_lock:
+      if (self.fd is not None):
+        self.fd.close();
+        self.fd = None;
+
+################################################################################
+########################## INTERNAL UTILITY FUNCTIONS ##########################
+################################################################################
+
+################################################################################
+################################# GET RELPATH ##################################
+  def get_relpath(self, path):
+    """
+    Return path relative to HDFQS root.
+
+    If the path is not within the HDFQS root, then return the path as is.
+
+    Parameters
+    ----------
+    path : str
+      Path of an HDF5 file.
+
+    Returns
+    -------
+    relpath : str
+      Path of specified file relative to HDFQS root, or absolute path if not within HDFQS root.
+    """
+
+    if (path.startswith(self.path)):
+      return os.path.relpath(path, self.path);
+    else:
+      return path;
+
+################################################################################
+################################ LIST DIRECTORY ################################
+  def list_directory(self, path):
+    """
+    Return the subdirectories and HDF5 files in a directory of the HDFQS data store.
+
+    The :literal:`.git`, :literal:`raw`, and :literal:`log` directories and the manifest entries are skipped, as in :meth:`register_directory`.
+
+    Parameters
+    ----------
+    path : str
+      Path of directory to list.
+
+    Returns
+    -------
+    subdirs : list
+      Full paths of subdirectories.
+    filenames : list
+      Full paths of HDF5 files.
+    """
+
+    subdirs = [ ];
+    filenames = [ ];
+    for name in os.listdir(path):
+      if ((name == ".git") or (name == "raw") or (name == "manifest.py") or (name == "manifest.d") or (name == "log")):
+        continue;
+      full_path = os.path.join(path, name);
+      if (os.path.isdir(full_path)):
+        subdirs.append(full_path);
+      elif (name.endswith(".h5")):
+        filenames.append(full_path);
+
+    return ( subdirs, filenames );
+
+################################################################################
+################################### LOG PATH ###################################
+  def log_path(self, path):
+    """
+    Return the path of the append log of a table.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+
+    Returns
+    -------
+    filename : str
+      Path of the log file (:samp:`{root}/log/{location}.{category}.{table}.log`).
+    """
+
+    return os.path.join(self.path, "log", path.strip("/").replace("/", ".") + ".log");
+
+################################################################################
+################################## LOG DTYPE ###################################
+  def log_dtype(self, path):
+    """
+    Return the dtype of the records in the append log of a table.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+
+    Returns
+    -------
+    dtype : np.dtype
+      Dtype of the records, or None if the table has no log.
+    """
+
+    filename = self.log_path(path)[:-4] + ".dtype";
+    if (not os.path.exists(filename)):
+      return None;
+    fd = open(filename, "r");
+    descr = json.load(fd);
+    fd.close();
+
+    return np.dtype([ ( str(name), str(x) ) for ( name, x ) in descr ]);
+
+################################################################################
+################################### READ LOG ###################################
+  def read_log(self, path):
+    """
+    Return the rows in the append log of a table which have not been compacted yet.
+
+    The log (and the log being compacted, if any) is memory-mapped. Incomplete records at the end of the log (from an append in progress) are ignored. The log being compacted is skipped once its rows are in a registered file (see :meth:`compact`).
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+
+    Returns
+    -------
+    rows : np.ndarray
+      Structured array of rows, or None if the table has no log.
+    """
+
+    dtype = self.log_dtype(path);
+    if (dtype is None):
+      return None;
+
+    parts = [ ];
+    filenames = [ self.log_path(path) ];
+    try:
+      fd = open(self.log_path(path) + ".compacting.dest", "r");
+      try:
+        log_id = str(json.load(fd)["id"]);
+      finally:
+        fd.close();
+    except (IOError, ValueError): # not being compacted, or the record is being written
+      log_id = None;
+    if ((log_id is None) or (all(entry.get("log_id") != log_id for entry in self.manifest.get(path, [ ])))):
+      filenames.insert(0, self.log_path(path) + ".compacting");
+    for filename in filenames:
+      try:
+        n = os.path.getsize(filename) // dtype.itemsize;
+      except OSError: # no log, or moved by compact
+        continue;
+      if (n > 0):
+        parts.append(np.memmap(filename, dtype=dtype, mode="r", shape=( n, )));
+    if (len(parts) == 0):
+      return np.empty(0, dtype=dtype);
+
+    return np.concatenate(parts);
+
+################################################################################
+#################################### QUERY #####################################
+  def query(self, path, start, stop):
+    """
+    Return filenames containing data from the specified table and time range.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+
+    Returns
+    -------
+    files : list
+      List of HDF5 filenames which contain the specified data in the specified time range. Data in the append log of the table which has not been compacted yet (see :meth:`append`) is not included; use :meth:`read_log` to check for it.
+    """
+
+    return [ entry["filename"] for entry in self.query_entries(path, start, stop) ];
+
+################################################################################
+################################ QUERY ENTRIES #################################
+  def query_entries(self, path, start, stop):
+    """
+    Return manifest entries for files containing data from the specified table and time range.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+
+    Returns
+    -------
+    entries : list
+      List of manifest entries (dicts with keys :literal:`filename`, :literal:`start`, :literal:`stop`, and, for files registered by this version, :literal:`sorted`) which contain the specified data in the specified time range.
+    """
+
+    entries = [ ];
+    for entry in self.manifest.get(path, [ ]):
+      if ((entry["start"] <= stop) and (entry["stop"] >= start)):
+        entries.append(entry);
+
+    return entries;
+
+################################################################################
+################################# VALUE RANGE ##################################
+  def value_range(self, path, start, stop, fields):
+    """
+    Return the range of the finite values of fields of a table in a time range, for the percentile histograms of :meth:`aggregate`.
+
+    The range is taken from the manifest statistics of the files overlapping the time range (see :meth:`scan_table`) and the rows of the append log. If any file has no statistics for one of the fields (e.g. it was registered by an older version, or contains infinite values), the data is read once to find the range instead.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    fields : list
+      Fields to find the range of.
+
+    Returns
+    -------
+    value_range : dict
+      Dict mapping each field to a :literal:`( min, max )` tuple, or None if the field has no finite values.
+    """
+
+    low = { };
+    high = { };
+    def update(field, x_low, x_high):
+      if ((x_low is not None) and (x_high is not None)):
+        low[field] = min(low.get(field, x_low), x_low);
+        high[field] = max(high.get(field, x_high), x_high);
+
+    entries = self.query_entries(path, start, stop);
+    if (all(("rows" in entry) and (entry["min"].get(field) is not None) and (entry["max"].get(field) is not None) for entry in entries for field in fields)):
+      for entry in entries:
+        for field in fields:
+          update(field, entry["min"].get(field), entry["max"].get(field));
+      log = self.read_log(path);
+      chunks = [ ] if (log is None) else [ log[(log["time"] >= start) & (log["time"] <= stop)] ];
+    else: # files without statistics, or with infinite values (which are not recorded in the statistics)
+      chunks = self.iter_chunks(path, start, stop, fields=fields);
+    for chunk in chunks:
+      for field in fields:
+        x = chunk[field].astype(np.float64);
+        x = x[np.isfinite(x)];
+        if (len(x) > 0):
+          update(field, float(x.min()), float(x.max()));
+
+    return dict((field, ( float(low[field]), float(high[field]) ) if (field in low) else None) for field in fields);
+
+################################################################################
+################################# ITER CHUNKS ##################################
+  def iter_chunks(self, path, start, stop, fields=None):
+    """
+    Iterate over blocks of data from the specified table and time range.
+
+    Each file containing data in the time range is read in blocks of :literal:`nrowsinbuf` rows. For files whose time column is sorted, only the row range within the time range is read. Note that the time range includes the endpoints.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    fields : list
+      Fields to read (default is all fields).
+
+    Returns
+    -------
+    chunks : generator
+      Generator of structured numpy arrays, each containing the requested fields for a block of rows within the time range. Blocks are returned file by file, in the order the files are returned by :meth:`query_entries`, followed by the rows of the append log (see :meth:`append`).
+    """
+
+    for entry in self.query_entries(path, start, stop):
+      with hdf5_lock: # the lock is not held while blocks are yielded
+        fd = tables.openFile(os.path.join(self.path, entry["filename"]), mode="r");
+      try:
+        with hdf5_lock:
+          t = HDFQS.open_table(fd.getNode(path));
+          if (entry.get("sorted", False)):
+            if (isinstance(t, EncodedTable)):
+              first = t.search_sorted(start, side="left");
+              last = t.search_sorted(stop, side="right");
+            else:
+              col = t.cols._f_col("time");
+              first = HDFQS.search_sorted(col, start, side="left");
+              last = HDFQS.search_sorted(col, stop, side="right");
+          else:
+            first = 0;
+            last = t.nrows;
+          step = max(t.nrowsinbuf, 1);
+        for i in range(first, last, step):
+          with hdf5_lock:
+            rows = t.read(i, min(i + step, last));
+          if (not entry.get("sorted", False)):
+            rows = rows[(rows["time"] >= start) & (rows["time"] <= stop)];
+          if (len(rows) == 0):
+            continue;
+          if (fields is not None):
+            rows = rows[fields];
+          yield rows;
+      finally:
+        with hdf5_lock:
+          fd.close();
+
+    log = self.read_log(path);
+    if (log is not None):
+      rows = log[(log["time"] >= start) & (log["time"] <= stop)];
+      if (len(rows) > 0):
+        yield rows if (fields is None) else rows[fields];
+
+################################################################################
+################################# GENERATE DF ##################################
+  def generate_df(self, tm, tz, data, cols):
+    """
+    Generate a Pandas DataFrame from numpy arrays.
+
+    See table under :meth:`write` for a summary of the required shape of the various numpy arrays.
+
+    Parameters
+    ----------
+    tm : np.ndarray(dtype=np.int64)
+      Time data. Shape must be ( N, ), where N is the number of data points.
+    tz : np.ndarray(dtype=np.int8)
+      Timezone values. Shape must be ( N, ), where N is the number of data points.
+    data : np.ndarray
+      Data to write. Shape must be ( N, P ), where N is the number of data points, P is the number of data columns.
+    cols : list
+      Names of the columns in :literal:`data`. Must have length P, where P is the number of data columns (excluding time and timezone).
+
+    Returns
+    -------
+    df : pd.DataFrame
+      Pandas DataFrame containing the data.
+
+    Raises
+    ------
+    InconsistentDimensionsException : :class:`InconsistentDimensionsException`
+      Dimensions of :literal:`time`, :literal:`tz`, :literal:`data`, and/or :literal:`cols` are not consistent. See Parameters above, or summary table under :meth:`write`.
+    """
+
+    # Check consistency of dimensions
     if ((tm.shape[0] != tz.shape[0]) or (tm.shape[0] != data.shape[0]) or (data.shape[1] != len(cols))):
       raise InconsistentDimensionsException("Dimensions of tm %s, tz %s, data %s, cols (%d) not consistent" % ( str(tm.shape), str(tz.shape), str(data.shape), len(cols) ));
 
-    tm = tm.astype(np.int64);
-    tz = tz.astype(np.int8);
-    df = pd.DataFrame(dict(time=tm, tz=tz));
-    for i in range(len(cols)):
-      df[cols[i]] = data[:,i];
+    tm = tm.astype(np.int64);
+    tz = tz.astype(np.int8);
+    df = pd.DataFrame(dict(time=tm, tz=tz));
+    for i in range(len(cols)):
+      df[cols[i]] = data[:,i];
+
+    return df;
+
+################################################################################
+################################ WRITE MANIFEST ################################
+  def write_manifest(self):
+    """
+    Write manifest to manifest file.
+
+    The manifest is written both to the manifest file, and split into per-location shards in the :literal:`manifest.d` directory for use in lazy mode.
+
+    To allow several processes to register files in the same HDFQS data store, writes are serialized with an exclusive lock on :literal:`manifest.lock` (where :literal:`fcntl` is available). While holding the lock, the manifest file is re-read, the files registered and unregistered by this object since its last write are applied to it, and the merged manifest is written and becomes the manifest of this object. Each file is written to a temporary file and renamed into place, so readers never see a partially written manifest.
+    """
+
+    with self.manifest_lock:
+      lock_fd = open(self.manifest_lock_path, "a");
+      try:
+        if (fcntl is not None):
+          fcntl.flock(lock_fd.fileno(), fcntl.LOCK_EX);
+        if ((self.manifest_replace) or (not os.path.exists(self.manifest_path))):
+          manifest = dict(self.manifest.items());
+        else:
+          temp = { };
+          execfile(self.manifest_path, temp);
+          manifest = temp["manifest"];
+          ( added, removed ) = ( list(self.manifest_added), list(self.manifest_removed) );
+          for relpath in removed:
+            self.unregister(relpath, write_manifest=False, manifest=manifest);
+          for relpath in added:
+            HDFQS.copy_entries(self.manifest, manifest, relpath);
+
+        HDFQS.write_atomic(self.manifest_path, "manifest = " + repr(manifest) + "\n");
+        if (not os.path.isdir(self.manifest_shard_path)):
+          os.mkdir(self.manifest_shard_path);
+        shards = { "FILES": { }, "ROOT": { } };
+        for ( key, value ) in manifest.items():
+          shard = LazyManifest.shard_name(key);
+          if (shard not in shards):
+            shards[shard] = { };
+          shards[shard][key] = value;
+        for ( shard, contents ) in shards.items():
+          HDFQS.write_atomic(os.path.join(self.manifest_shard_path, shard + ".py"), "manifest = " + repr(contents) + "\n");
+        for filename in os.listdir(self.manifest_shard_path): # remove shards of locations no longer in the manifest
+          if ((filename.endswith(".py")) and (filename[:-3] not in shards)):
+            os.remove(os.path.join(self.manifest_shard_path, filename));
+
+        self.manifest = manifest;
+        self.manifest_added = set();
+        self.manifest_removed = set();
+        self.manifest_replace = False;
+      finally:
+        lock_fd.close(); # releases the lock
+
+################################################################################
+################################# WRITE ATOMIC #################################
+  @staticmethod
+  def write_atomic(filename, contents):
+    """
+    Write a file by writing a temporary file in the same directory and renaming it into place.
+
+    Parameters
+    ----------
+    filename : str
+      Path of file to write.
+    contents : str
+      Contents of the file.
+    """
+
+    ( fd, temp_path ) = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(os.path.abspath(filename)));
+    try:
+      try:
+        os.write(fd, contents);
+        os.fsync(fd);
+      finally:
+        os.close(fd);
+      os.chmod(temp_path, 0644);
+      os.rename(temp_path, filename);
+    except:
+      if (os.path.exists(temp_path)):
+        os.remove(temp_path);
+      raise;
+
+################################################################################
+################################## ADD ENTRY ###################################
+  @staticmethod
+  def add_entry(manifest, path, entry):
+    """
+    Add the entry for one file of a table to a manifest, and extend the time range of the table.
+
+    Parameters
+    ----------
+    manifest : dict
+      Manifest to add the entry to.
+    path : str
+      HDF5 path to the data table.
+    entry : dict
+      Manifest entry, with at least the keys :literal:`filename`, :literal:`start`, and :literal:`stop`.
+    """
+
+    ( location_name, group_name, table_name ) = path.split("/")[1:4];
+    ( start, stop ) = ( entry["start"], entry["stop"] );
+    if (not manifest.has_key(path)):
+      manifest[path] = [ entry ];
+    else:
+      manifest[path].append(entry);
+
+    if (location_name not in manifest["ROOT"]):
+      manifest["ROOT"][location_name] = { };
+    if (group_name not in manifest["ROOT"][location_name]):
+      manifest["ROOT"][location_name][group_name] = { };
+    if (table_name not in manifest["ROOT"][location_name][group_name]):
+      manifest["ROOT"][location_name][group_name][table_name] = [ start, stop ];
+    else:
+      ( old_start, old_stop ) = manifest["ROOT"][location_name][group_name][table_name];
+      manifest["ROOT"][location_name][group_name][table_name] = [ np.minimum(start, old_start), np.maximum(stop, old_stop) ];
+
+################################################################################
+################################# COPY ENTRIES #################################
+  @staticmethod
+  def copy_entries(src, dst, relpath):
+    """
+    Copy all entries for a file from one manifest to another.
+
+    Nothing is copied if the file is already in the destination manifest, or is not in the source manifest.
+
+    Parameters
+    ----------
+    src : dict
+      Manifest to copy entries from.
+    dst : dict
+      Manifest to copy entries to.
+    relpath : str
+      Path of the file, relative to the HDFQS root.
+    """
+
+    if ((relpath in dst["FILES"]) or (relpath not in src["FILES"])):
+      return;
+
+    dst["FILES"][relpath] = src["FILES"][relpath];
+    for ( path, entries ) in src.items():
+      if (not path.startswith("/")):
+        continue;
+      for entry in entries:
+        if (entry["filename"] == relpath):
+          HDFQS.add_entry(dst, path, entry);
+
+################################################################################
+################################## SCAN TABLE ##################################
+  @staticmethod
+  def scan_table(table, time_field="time", gap_factor=10):
+    """
+    Return summary statistics of a table, for its manifest entry.
+
+    The table is read in blocks of :literal:`table.nrowsinbuf` rows, so memory use does not depend on the size of the table. The statistics are returned as a dict with the keys:
+
+    +----------+---------------------------------------------------------------+
+    | Key      | Value                                                         |
+    +==========+===============================================================+
+    | start    | Minimum time                                                  |
+    +----------+---------------------------------------------------------------+
+    | stop     | Maximum time                                                  |
+    +----------+---------------------------------------------------------------+
+    | sorted   | Whether the time column is in non-decreasing order            |
+    +----------+---------------------------------------------------------------+
+    | rows     | Number of rows                                                |
+    +----------+---------------------------------------------------------------+
+    | interval | Typical time between rows, in ns (None if not sorted)         |
+    +----------+---------------------------------------------------------------+
+    | coverage | List of :literal:`[ start, stop ]` intervals containing data  |
+    +----------+---------------------------------------------------------------+
+    | min      | Dict of minimum of each numeric column (NaN values ignored)   |
+    +----------+---------------------------------------------------------------+
+    | max      | Dict of maximum of each numeric column (NaN values ignored)   |
+    +----------+---------------------------------------------------------------+
+    | sum      | Dict of sum of each numeric column, except time               |
+    +----------+---------------------------------------------------------------+
+
+    Statistics which are not defined (e.g. minimum of a column containing only NaN) are None. The typical time between rows is the median of the median (nonzero) time between rows of each block.
+
+    The coverage intervals are split at every gap between rows longer than :literal:`gap_factor` times the typical time between rows of the block containing the gap. If the time column is not sorted, the coverage is a single interval from the minimum to the maximum time.
+
+    Parameters
+    ----------
+    table : tables.Table
+      Table to scan.
+    time_field : str
+      Name of the time field in the table (default is "time").
+    gap_factor : float
+      Multiple of the typical time between rows above which a gap splits the coverage intervals (default is 10).
+
+    Returns
+    -------
+    stats : dict
+      Summary statistics of the table (see above).
+    """
+
+    names = [ x for x in table.colnames if (table.coldtypes[x].kind in "biuf") ];
+    low = dict((x, None) for x in names);
+    high = dict((x, None) for x in names);
+    total = dict((x, 0) for x in names if (x != time_field));
+    intervals = [ ];
+    coverage = [ ];
+    coverage_start = None;
+    is_sorted = True;
+    last = None;
+    step = max(table.nrowsinbuf, 1);
+    for i in range(0, table.nrows, step):
+      rows = table.read(i, min(i + step, table.nrows));
+      if (len(rows) == 0):
+        continue;
+      tm = rows[time_field];
+      if (is_sorted):
+        if (((last is not None) and (tm[0] < last)) or (np.any(tm[1:] < tm[:-1]))):
+          is_sorted = False;
+        else:
+          times = tm if (last is None) else np.r_[ last, tm ];
+          dt = np.diff(times);
+          if (np.any(dt > 0)):
+            intervals.append(np.median(dt[dt > 0]));
+          if (coverage_start is None):
+            coverage_start = tm[0];
+          if (len(intervals) > 0):
+            for j in np.flatnonzero(dt > gap_factor * intervals[-1]):
+              coverage.append([ coverage_start, times[j] ]);
+              coverage_start = times[j+1];
+      last = tm[-1];
+      for x in names:
+        values = rows[x];
+        if (values.dtype.kind == "f"):
+          values = values[~np.isnan(values)];
+        if (len(values) == 0):
+          continue;
+        low[x] = values.min() if (low[x] is None) else min(low[x], values.min());
+        high[x] = values.max() if (high[x] is None) else max(high[x], values.max());
+        if (x != time_field):
+          total[x] = total[x] + values.sum(dtype=(np.float64 if (values.dtype.kind == "f") else np.int64));
+
+    stats = { "start": HDFQS.to_manifest_value(low[time_field]), "stop": HDFQS.to_manifest_value(high[time_field]), "sorted": is_sorted, "rows": int(table.nrows) };
+    stats["interval"] = HDFQS.to_manifest_value(np.median(intervals)) if ((is_sorted) and (len(intervals) > 0)) else None;
+    if ((is_sorted) and (coverage_start is not None)):
+      coverage.append([ coverage_start, last ]);
+    else:
+      coverage = [ [ low[time_field], high[time_field] ] ];
+    stats["coverage"] = [ [ HDFQS.to_manifest_value(a), HDFQS.to_manifest_value(b) ] for ( a, b ) in coverage ];
+    stats["min"] = dict((x, HDFQS.to_manifest_value(low[x])) for x in names);
+    stats["max"] = dict((x, HDFQS.to_manifest_value(high[x])) for x in names);
+    stats["sum"] = dict((x, HDFQS.to_manifest_value(total[x])) for x in total.keys());
+
+    return stats;
+
+################################################################################
+################################# TABLE LAYOUT #################################
+  def table_layout(self, path, tm, nrows):
+    """
+    Choose the chunk layout of a new table from the sampling rate of its data.
+
+    The expected number of rows in the file is the file duration (see :meth:`__init__`) divided by the median time between rows, and at least the number of rows being written. This is passed to PyTables as :literal:`expectedrows`, which PyTables uses to choose the chunk size. For tables expected to have fewer than 1000 rows per file (e.g. daily readings), the chunk is set to hold the expected rows (at least 32), since the chunks PyTables chooses are much larger. The choice can be overridden for specific tables with the :literal:`layouts` argument of :meth:`__init__`.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    tm : np.ndarray(dtype=np.int64)
+      Time of the rows being written (or a sample of them).
+    nrows : int
+      Number of rows being written.
+
+    Returns
+    -------
+    layout : dict
+      Keyword arguments :literal:`expectedrows` and :literal:`chunkshape` for :literal:`tables.createTable`.
+    """
+
+    override = self.layouts.get(path, { });
+    expectedrows = override.get("expectedrows");
+    if (expectedrows is None):
+      diffs = np.diff(np.asarray(tm, dtype=np.int64));
+      diffs = diffs[diffs > 0];
+      expectedrows = nrows;
+      if (len(diffs) > 0):
+        expectedrows = max(int(self.file_duration / np.median(diffs)), nrows);
+    expectedrows = max(int(expectedrows), 1);
+    chunkshape = override.get("chunkshape");
+    if (isinstance(chunkshape, (int, long))):
+      chunkshape = ( chunkshape, );
+    elif ((chunkshape is None) and (expectedrows < 1000)): # PyTables does not go below ~64 kB chunks
+      chunkshape = ( max(expectedrows, 32), );
+
+    return { "expectedrows": expectedrows, "chunkshape": chunkshape };
+
+################################################################################
+################################## OPEN TABLE ##################################
+  @staticmethod
+  def open_table(node):
+    """
+    Return the data table stored at an HDF5 node.
+
+    Parameters
+    ----------
+    node : tables.Node
+      Node in an HDF5 file.
+
+    Returns
+    -------
+    table : tables.Table or :class:`EncodedTable`
+      The node itself if it is a table, an :class:`EncodedTable` if it is the group of an encoded event table, or None if the node is not a data table.
+    """
+
+    if (isinstance(node, tables.Table)):
+      return node;
+    elif ((isinstance(node, tables.Group)) and ("hdfqs_encoding" in node._v_attrs._v_attrnames)):
+      return EncodedTable(node);
+    else:
+      return None;
+
+################################################################################
+################################# TABLE SCHEMA #################################
+  @staticmethod
+  def table_schema(table):
+    """
+    Return the schema of a table, for its manifest entry.
+
+    Parameters
+    ----------
+    table : tables.Table or :class:`EncodedTable`
+      Table to describe.
+
+    Returns
+    -------
+    schema : dict
+      Dict with the keys :literal:`columns` (list of column names, in order), :literal:`dtypes` (dict of numpy dtype strings, e.g. "<i8"), :literal:`units` (the table's :literal:`units` attribute, or an empty dict), and :literal:`filters` (dict with the keys :literal:`complevel`, :literal:`complib`, :literal:`shuffle`, and :literal:`fletcher32`).
+    """
+
+    units = table.attrs["units"] if ("units" in table.attrs._v_attrnames) else { };
+    filters = table.filters;
+    return {
+      "columns": list(table.colnames),
+      "dtypes": dict((x, table.coldtypes[x].str) for x in table.colnames),
+      "units": dict(units),
+      "filters": { "complevel": int(filters.complevel), "complib": str(filters.complib), "shuffle": bool(filters.shuffle), "fletcher32": bool(filters.fletcher32) }
+    };
+
+################################################################################
+############################## TO MANIFEST VALUE ###############################
+  @staticmethod
+  def to_manifest_value(x):
+    """
+    Convert a numpy scalar to a Python value which can be written to the manifest.
+
+    Parameters
+    ----------
+    x : numpy scalar
+      Value to convert.
+
+    Returns
+    -------
+    value : int, float, bool, or None
+      Converted value. NaN and infinite values are converted to None, since their repr cannot be read back.
+    """
+
+    if (x is None):
+      return None;
+    elif (isinstance(x, (bool, np.bool_))):
+      return bool(x);
+    elif (isinstance(x, (int, long, np.integer))):
+      return int(x);
+    elif (np.isfinite(x)):
+      return float(x);
+    else:
+      return None;
+
+################################################################################
+############################### ENTRY MAY MATCH ################################
+  @staticmethod
+  def entry_may_match(entry, conditions):
+    """
+    Check, using its summary statistics, whether a file may contain rows matching a list of conditions.
+
+    Files registered without summary statistics, or without statistics for a column in the conditions, are assumed to match.
+
+    Parameters
+    ----------
+    entry : dict
+      Manifest entry of the file.
+    conditions : list
+      List of :samp:`( {column}, {operator}, {value} )` tuples (see :meth:`load`).
+
+    Returns
+    -------
+    match : bool
+      False if no row in the file can match all conditions, True otherwise.
+    """
+
+    for ( column, op, value ) in conditions:
+      low = entry.get("min", { }).get(column);
+      high = entry.get("max", { }).get(column);
+      if ((low is None) or (high is None)):
+        continue;
+      if (((op == "==") and ((value < low) or (value > high))) or
+          ((op == "!=") and (low == high == value)) or
+          ((op == "<") and (low >= value)) or
+          ((op == "<=") and (low > value)) or
+          ((op == ">") and (high <= value)) or
+          ((op == ">=") and (high < value))):
+        return False;
+
+    return True;
+
+################################################################################
+############################### ENTRIES OVERLAP ################################
+  @staticmethod
+  def entries_overlap(entries, time_field="time"):
+    """
+    Check whether data from several files needs to be merged to be in time order.
+
+    Parameters
+    ----------
+    entries : list
+      Manifest entries of the files, sorted by start time.
+    time_field : str
+      Name of the time field the data is ordered by (default is "time").
+
+    Returns
+    -------
+    overlap : bool
+      False if the time ranges of the files do not overlap and each file is sorted by time, True otherwise.
+    """
+
+    if (time_field != "time"):
+      return True;
+    last_stop = None;
+    for entry in entries:
+      if (not entry.get("sorted", False)):
+        return True;
+      if ((last_stop is not None) and (entry["start"] <= last_stop)):
+        return True;
+      last_stop = entry["stop"];
+
+    return False;
+
+################################################################################
+################################# UNIFY PARTS ##################################
+  @staticmethod
+  def unify_parts(parts):
+    """
+    Convert the data loaded from several files (or data stores) to a common dtype, so it can be concatenated.
+
+    Only the fields present in all parts are kept, in the order of the first part. Each field is converted to the dtype which can hold its values from all parts (see :literal:`np.result_type`), e.g. float64 if it is float32 in one part and float64 in another.
+
+    Parameters
+    ----------
+    parts : list
+      List of :literal:`( rows, invalid )` tuples (see :meth:`assemble`).
+
+    Returns
+    -------
+    parts : list
+      List of :literal:`( rows, invalid )` tuples, with the same dtype for all :literal:`rows`.
+    """
+
+    if (len(parts) == 0):
+      return parts;
+    dtype = parts[0][0].dtype;
+    if (all(rows.dtype == dtype for ( rows, invalid ) in parts)):
+      return parts;
+
+    names = [ x for x in dtype.names if all(x in rows.dtype.names for ( rows, invalid ) in parts) ];
+    dtype = np.dtype([ ( name, np.result_type(*[ rows.dtype[name] for ( rows, invalid ) in parts ]) ) for name in names ]);
+    common = [ ];
+    for ( rows, invalid ) in parts:
+      x = np.empty(len(rows), dtype=dtype);
+      for name in names:
+        x[name] = rows[name];
+      common.append(( x, invalid ));
+
+    return common;
+
+################################################################################
+################################# MERGE PARTS ##################################
+  @staticmethod
+  def merge_parts(parts, time_field="time"):
+    """
+    Merge the data loaded from several files by time, and drop exact duplicate rows.
+
+    The rows of all files are concatenated and sorted by time only, with a stable merge sort, which is fast for data made of a few runs that are already sorted (one per file). Duplicates can only occur among rows with the same time, so only these rows are also sorted by the other fields (so exact duplicates are next to each other), and a row is dropped if all of its fields are equal to those of the previous row.
+
+    Parameters
+    ----------
+    parts : list
+      List of :literal:`( rows, invalid )` tuples, one per file (see :meth:`assemble`).
+    time_field : str
+      Name of the time field to sort by (default is "time").
+
+    Returns
+    -------
+    parts : list
+      List containing a single :literal:`( rows, invalid )` tuple with the merged data, or an empty list if there is no data.
+    """
+
+    if (len(parts) == 0):
+      return parts;
+    parts = HDFQS.unify_parts(parts);
+    rows = np.concatenate([ x for ( x, invalid ) in parts ]);
+    if (any(invalid is not None for ( x, invalid ) in parts)):
+      invalid = np.concatenate([ (np.zeros(len(x), dtype=bool) if (y is None) else y) for ( x, y ) in parts ]);
+    else:
+      invalid = None;
+
+    order = np.argsort(rows[time_field], kind="mergesort");
+    rows = rows[order];
+    tm = rows[time_field];
+    same = np.flatnonzero(tm[1:] == tm[:-1]) + 1; # rows with the same time as the previous row
+    if (len(same) == 0):
+      if (invalid is not None):
+        invalid = invalid[order];
+      return [ ( rows, invalid ) ];
+
+    # Sort each run of rows with the same time by all fields
+    runs = np.unique(np.concatenate(( same - 1, same )));
+    sub = rows[runs];
+    keys = [ sub[x] for x in reversed(sub.dtype.names) if (x != time_field) ] + [ sub[time_field] ];
+    sub_order = np.lexsort(keys);
+    rows[runs] = sub[sub_order];
+    order[runs] = order[runs][sub_order];
+    keep = np.ones(len(rows), dtype=bool);
+    keep[same] = (rows[same] != rows[same - 1]);
+    rows = rows[keep];
+    if (invalid is not None):
+      invalid = invalid[order][keep];
+
+    return [ ( rows, invalid ) ];
+
+################################################################################
+################################### ASSEMBLE ###################################
+  @staticmethod
+  def assemble(parts, names, output, masked, dtypes=None):
+    """
+    Assemble the data loaded from each file into the result of :meth:`load`.
+
+    Parameters
+    ----------
+    parts : list
+      List of :literal:`( rows, invalid )` tuples, one per file, where :literal:`rows` is a structured array and :literal:`invalid` is a boolean array marking rows whose value is masked (or None).
+    names : list
+      Fields to return. The first is the time field, the second is the value field.
+    output : str
+      Type of data to return, one of "array", "dict", "arrow".
+    masked : bool
+      Whether the value is masked.
+    dtypes : dict
+      Dtypes of the fields, used for empty results (default is None - int64 for the time field and float64 for other fields). See :meth:`get_dtypes`.
+
+    Returns
+    -------
+    data : numpy.ma.array, dict, or pyarrow.Table
+      See :meth:`load`.
+    """
+
+    ( time_field, value_field ) = names[:2];
+    dtypes = dict(dtypes) if (dtypes is not None) else { };
+    dtypes.setdefault(time_field, np.dtype(np.int64));
+    empty = dict((name, np.empty(0, dtype=dtypes.get(name, np.float64))) for name in names);
+    if (output == "array"):
+      if (len(parts) == 0):
+        return np.ma.array(np.empty(( 0, 2 ), dtype=np.result_type(empty[time_field], empty[value_field])));
+      data = np.ma.array(np.concatenate([ np.column_stack(( rows[time_field], rows[value_field] )) for ( rows, invalid ) in parts ]));
+      if (masked):
+        invalid = np.ma.getmaskarray(data);
+        invalid[:,1] = np.concatenate([ x for ( rows, x ) in parts ]);
+        data.mask = invalid;
+      return data;
+    elif (output == "dict"):
+      if (len(parts) == 0):
+        return empty;
+      data = dict((name, np.concatenate([ rows[name] for ( rows, invalid ) in parts ])) for name in names);
+      if (masked):
+        data[value_field] = np.ma.array(data[value_field], mask=np.concatenate([ x for ( rows, x ) in parts ]));
+      return data;
+    else:
+      batches = [ ];
+      for ( rows, invalid ) in parts:
+        arrays = [ ];
+        for name in names:
+          if ((masked) and (name == value_field)):
+            arrays.append(pa.array(rows[name], mask=invalid));
+          else:
+            arrays.append(pa.array(rows[name]));
+        batches.append(pa.RecordBatch.from_arrays(arrays, names));
+      if (len(batches) == 0):
+        return pa.Table.from_arrays([ pa.array(empty[name]) for name in names ], names);
+      return pa.Table.from_batches(batches);
+
+################################################################################
+############################# HISTOGRAM PERCENTILE #############################
+  @staticmethod
+  def histogram_percentile(hist, n, q, value_range, low, high):
+    """
+    Compute approximate percentiles from per-bucket histograms (see :meth:`aggregate`).
+
+    The percentile is interpolated linearly within the bin containing it, and limited to the exact minimum and maximum of the bucket.
+
+    Parameters
+    ----------
+    hist : np.ndarray
+      Histogram counts, with shape :literal:`( nbuckets, bins )`.
+    n : np.ndarray
+      Number of values in each bucket.
+    q : float
+      Percentile, between 0 and 100.
+    value_range : tuple
+      :literal:`( min, max )` range spanned by the bins.
+    low : np.ndarray
+      Minimum value in each bucket.
+    high : np.ndarray
+      Maximum value in each bucket.
+
+    Returns
+    -------
+    values : np.ndarray
+      Percentile of each bucket (NaN for empty buckets).
+    """
+
+    ( nbuckets, bins ) = hist.shape;
+    width = (value_range[1] - value_range[0]) / float(bins);
+    rank = np.maximum(q / 100.0 * n, 1e-9); # q=0 falls in the first non-empty bin
+    cum = np.cumsum(hist, axis=1);
+    b = np.argmax(cum >= rank[:, None], axis=1);
+    rows = np.arange(nbuckets);
+    with np.errstate(invalid="ignore", divide="ignore"):
+      frac = (rank - (cum[rows, b] - hist[rows, b])) / hist[rows, b];
+    values = np.clip(value_range[0] + (b + np.nan_to_num(frac)) * width, low, high);
+
+    return np.where(n == 0, np.nan, values);
+
+################################################################################
+############################## COMPILE CONDITIONS ##############################
+  @staticmethod
+  def compile_conditions(colnames, conditions):
+    """
+    Compile a list of conditions into a PyTables condition string.
+
+    Column names and operators are checked against the columns of the table and a list of allowed operators, and values are passed as bound variables rather than formatted into the condition string.
+
+    Parameters
+    ----------
+    colnames : list
+      Names of the columns of the table the conditions are evaluated on.
+    conditions : list
+      List of :samp:`( {column}, {operator}, {value} )` tuples, or None.
+
+    Returns
+    -------
+    condition : str
+      Condition string combining all conditions with "&", or None if there are no conditions.
+    condvars : dict
+      Bound variables referenced by :literal:`condition`.
+
+    Raises
+    ------
+    InconsistentArgumentsException : :class:`InconsistentArgumentsException`
+      Invalid column or operator in :literal:`conditions`.
+    """
+
+    if ((conditions is None) or (len(conditions) == 0)):
+      return ( None, { } );
+
+    terms = [ ];
+    condvars = { };
+    for i in range(len(conditions)):
+      ( column, op, value ) = conditions[i];
+      if (column not in colnames):
+        raise InconsistentArgumentsException("Invalid column in condition: \"%s\"" % ( column ));
+      if (op not in [ "==", "!=", "<", "<=", ">", ">=" ]):
+        raise InconsistentArgumentsException("Invalid operator in condition: \"%s\"" % ( op ));
+      name = "hdfqs_value%d" % ( i );
+      terms.append("(%s %s %s)" % ( column, op, name ));
+      condvars[name] = value;
+
+    return ( " & ".join(terms), condvars );
+
+################################################################################
+################################ SEARCH SORTED #################################
+  @staticmethod
+  def search_sorted(col, value, side="left"):
+    """
+    Binary search a sorted column on disk.
+
+    Only the rows visited by the search are read, so the cost is logarithmic in the length of the column.
+
+    Parameters
+    ----------
+    col : tables.Column
+      Column to search. Must be sorted in non-decreasing order.
+    value : int64
+      Value to search for.
+    side : str
+      If "left", return the index of the first row with a value not less than :literal:`value`. If "right", return the index of the first row with a value greater than :literal:`value` (default is "left").
+
+    Returns
+    -------
+    index : int
+      Row index at which :literal:`value` would be inserted to keep the column sorted.
+    """
+
+    lo = 0;
+    hi = len(col);
+    while (lo < hi):
+      mid = (lo + hi) // 2;
+      x = col[mid];
+      if ((x < value) or ((side == "right") and (x == value))):
+        lo = mid + 1;
+      else:
+        hi = mid;
+
+    return lo;
+
+################################################################################
+############################## ADD VERIFY RESULT ###############################
+  @staticmethod
+  def add_verify_result(report, relpath, size, errors):
+    """
+    Add the result of verifying one file to a verification report (see :meth:`verify`).
+
+    Parameters
+    ----------
+    report : dict
+      Verification report.
+    relpath : str
+      Name of the file verified.
+    size : int
+      Size of the file, in bytes.
+    errors : list
+      Error messages (empty if the file is good).
+    """
+
+    report["bytes"] = report["bytes"] + size;
+    if (len(errors) > 0):
+      report["bad_files"][relpath] = errors;
+      print "%s: %s" % ( relpath, "; ".join(errors) );
+
+################################################################################
+############################## CREATE DESCRIPTION ##############################
+  @staticmethod
+  def create_description(df):
+    """
+    Create a PyTables description dict from a Pandas DataFrame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+      Dataframe to base description on (dtypes are automatically converted to PyTables column types).
+
+    Returns
+    -------
+    descr : dict
+      PyTables description generated from the column dtypes of the dataframe.
+    """
+
+    descr = dict();
+    cols = df.columns.tolist();
+    dtypes = df.dtypes.tolist();
+    for i in range(len(cols)):
+      col = cols[i];
+      col_dtype = dtypes[i];
+      descr[col] = tables.Col.from_dtype(col_dtype, pos=i);
+
+    return descr;
+
+################################################################################
+############################### HDFQS FEDERATION ###############################
+################################################################################
+class HDFQSFederation:
+  """
+  This class presents several HDFQS data stores as a single namespace for reading.
+
+  A table path (e.g. :literal:`/self/Health/hr`) refers to the table of that name in every data store. Queries and loads are sent to the data stores containing the table, in parallel, and the results are merged by time.
+
+  Loads from several data stores run in a pool of worker processes which is started on first use and reused; call :meth:`close` to stop it.
+  """
+
+  def __init__(self, paths, workers=None, lazy=False):
+    """
+    Create an HDFQS federation given the paths to several HDFQS data stores.
+
+    Unless :literal:`lazy` is True, the data stores are registered (see :meth:`HDFQS.register_directory`) in parallel by separate processes.
+
+    Parameters
+    ----------
+    paths : list
+      Paths of roots of HDFQS data stores.
+    workers : int
+      Number of worker processes (default is None - one per data store).
+    lazy : bool
+      Whether or not to load the manifests lazily, without registering new files (default is False). See :class:`HDFQS`.
+    """
+
+    self.paths = list(paths);
+    self.workers = len(self.paths) if (workers is None) else workers;
+    self.lazy = lazy;
+    self.stores = [ ];
+    self.root = None;
+    self.pool = None;
+    self.refresh();
+
+################################################################################
+################################### REFRESH ####################################
+  def refresh(self):
+    """
+    Reload the manifests of all data stores, registering new files, and rebuild the merged view of their manifests.
+    """
+
+    if (self.lazy):
+      self.stores = [ HDFQS(path, lazy=True) for path in self.paths ];
+    else:
+      manifests = self.run(load_manifest, self.paths);
+      self.stores = [ ];
+      for ( path, manifest ) in zip(self.paths, manifests):
+        store = HDFQS(path, register=False);
+        store.manifest = manifest;
+        self.stores.append(store);
+    self.root = None;
+
+################################################################################
+################################### GET ROOT ###################################
+  def get_root(self):
+    """
+    Return the merged :literal:`ROOT` entry of the manifests of all data stores.
+
+    The merged entry is cached until :meth:`refresh` is called.
+
+    Returns
+    -------
+    root : dict
+      Dict of locations, each a dict of categories, each a dict mapping tables to their :literal:`[ start, stop ]` time range over all data stores.
+    """
+
+    if (self.root is None):
+      root = { };
+      for store in self.stores:
+        for ( location, categories ) in store.manifest["ROOT"].items():
+          for ( category, tables_in_category ) in categories.items():
+            merged = root.setdefault(location, { }).setdefault(category, { });
+            for ( table, ( start, stop ) ) in tables_in_category.items():
+              if (table in merged):
+                merged[table] = [ min(start, merged[table][0]), max(stop, merged[table][1]) ];
+              else:
+                merged[table] = [ start, stop ];
+      self.root = root;
+
+    return self.root;
+
+################################################################################
+################################ GET LOCATIONS #################################
+  def get_locations(self):
+    """
+    Return all locations within all data stores.
+
+    Returns
+    -------
+    locations : list
+      List containing all locations.
+    """
+
+    return self.get_root().keys();
+
+################################################################################
+################################ GET CATEGORIES ################################
+  def get_categories(self, location):
+    """
+    Return all categories within specified location, in all data stores. See :meth:`HDFQS.get_categories`.
+
+    Parameters
+    ----------
+    location : str
+      Location, or HDF5 path to the location.
+
+    Returns
+    -------
+    categories : list
+      List containing all categories within the specified location.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified location does not exist.
+    """
+
+    try:
+      return self.get_root()[location.strip("/")].keys();
+    except KeyError:
+      raise NonexistantLocationException("Invalid location \"%s\"" % ( location ));
+
+################################################################################
+################################## GET TABLES ##################################
+  def get_tables(self, location, category=None):
+    """
+    Return all tables within specified category, in all data stores. See :meth:`HDFQS.get_tables`.
+
+    Parameters
+    ----------
+    location : str
+      Location containing the specified category, or HDF5 path to the category.
+    category : str
+      Category under which to search for tables. Omit this parameter if specifying the category as a path in HDF5.
+
+    Returns
+    -------
+    tables : list
+      List containing all tables within the specified category.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified location/category does not exist.
+    """
+
+    try:
+      if (category is None):
+        ( location, category ) = location.strip("/").split("/");
+      return self.get_root()[location][category].keys();
+    except (KeyError, ValueError):
+      raise NonexistantLocationException("Invalid location/category: \"%s\", \"%s\"" % ( location, category ));
+
+################################################################################
+################################ GET TIME RANGE ################################
+  def get_time_range(self, path):
+    """
+    Return the minimum and maximum time of data in the specified table, over all data stores.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to the data table.
+
+    Returns
+    -------
+    time_range : list
+      List containing minimum time as element 0, maximum time as element 1.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path does not exist.
+    """
+
+    try:
+      ( location, category, table ) = path.strip("/").split("/");
+      return self.get_root()[location][category][table];
+    except (KeyError, ValueError):
+      raise NonexistantLocationException("Invalid path: \"%s\"" % ( path ));
+
+################################################################################
+#################################### EXISTS ####################################
+  def exists(self, path):
+    """
+    Check if a location, category, or table exists in any data store.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to a location, category, or table.
+
+    Returns
+    -------
+    existance : bool
+      True if the specified path exists, False otherwise.
+    """
+
+    node = self.get_root();
+    for name in path.strip("/").split("/"):
+      if ((type(node) != dict) or (name not in node)):
+        return False;
+      node = node[name];
+
+    return True;
+
+################################################################################
+#################################### QUERY #####################################
+  def query(self, path, start, stop):
+    """
+    Return files containing data from the specified table and time range, in all data stores.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+
+    Returns
+    -------
+    files : list
+      List of :literal:`( root, filename )` tuples.
+    """
+
+    return [ ( store.path, filename ) for store in self.stores if (store.manifest.has_key(path)) for filename in store.query(path, start, stop) ];
+
+################################################################################
+##################################### LOAD #####################################
+  def load(self, path, start, stop, output="array", merge=False, **kwargs):
+    """
+    Return data from the specified table and time range, from all data stores.
+
+    Data stores are loaded if they contain data in the time range, in HDF5 files or in the append log of the table (see :meth:`HDFQS.append`). If the field dtypes differ between data stores, each field is converted to a common dtype (see :meth:`HDFQS.unify_parts`). If more than one data store contains data in the time range, each is loaded by a process of the worker pool (see :meth:`HDFQS.load`; other keyword arguments are passed on); if only one does, it is loaded in this process. The results are sorted by time; if :literal:`merge` is True, exact duplicate rows are also dropped, within and across data stores.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to the data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+    output : str
+      Type of data to return, one of "array", "dict", "arrow" (default is "array").
+    merge : bool
+      Whether to drop duplicate rows (default is False).
+
+    Returns
+    -------
+    data : numpy.ma.array, dict, or pyarrow.Table
+      See :meth:`HDFQS.load`.
+    """
+
+    time_field = kwargs.get("time_field", "time");
+    value_field = kwargs.get("value_field", "value");
+    names = [ time_field, value_field ] + [ x for x in (kwargs.get("fields") or [ ]) if (x not in [ time_field, value_field ]) ];
+    masked = kwargs.get("mask", False) and (len(kwargs.get("conditions") or [ ]) > 0);
+    if (merge): # duplicates can only be detected if all fields are loaded
+      names = names + [ x for x in self.get_fields(path) if (x not in names) ];
+    kwargs["fields"] = names;
+
+    tasks = [ ( store.path, { path: store.manifest.get(path, [ ]) }, path, start, stop, merge, kwargs ) for store in self.stores if (self.has_data(store, path, start, stop)) ];
+    parts = [ ];
+    for data in self.run(run_load, tasks, persistent=True):
+      if (len(data[time_field]) == 0):
+        continue;
+      rows = np.empty(len(data[time_field]), dtype=[ ( x, data[x].dtype ) for x in names ]);
+      for x in names:
+        rows[x] = np.ma.getdata(data[x]);
+      parts.append(( rows, np.ma.getmaskarray(data[value_field]) if (masked) else None ));
+
+    if (merge):
+      parts = HDFQS.merge_parts(parts, time_field);
+    elif (len(parts) > 1):
+      parts = HDFQS.unify_parts(parts);
+      rows = np.concatenate([ x for ( x, invalid ) in parts ]);
+      order = np.argsort(rows[time_field], kind="mergesort");
+      invalid = np.concatenate([ x for ( y, x ) in parts ])[order] if (masked) else None;
+      parts = [ ( rows[order], invalid ) ];
+    if (output == "array"):
+      names = names[:2];
+    dtypes = None;
+    if (len(parts) == 0): # dtypes of an empty result, as if data from all data stores was combined
+      dtypes = { };
+      for store in self.stores:
+        for ( name, dtype ) in store.get_dtypes(path).items():
+          dtypes[name] = np.result_type(dtypes[name], dtype) if (name in dtypes) else dtype;
+
+    return HDFQS.assemble(parts, names, output, masked, dtypes);
 
-    return df;
+################################################################################
+################################### HAS DATA ###################################
+  def has_data(self, store, path, start, stop):
+    """
+    Check whether a data store contains data from the specified table and time range, in its HDF5 files or its append log.
+
+    Parameters
+    ----------
+    store : :class:`HDFQS`
+      Data store.
+    path : str
+      HDF5 path to data table.
+    start : int64
+      Start of time range, in ns since the epoch.
+    stop : int64
+      End of time range, in ns since the epoch.
+
+    Returns
+    -------
+    has_data : bool
+      True if the data store contains data in the time range, False otherwise.
+    """
+
+    if ((store.manifest.has_key(path)) and (len(store.query(path, start, stop)) > 0)):
+      return True;
+    log = store.read_log(path);
+
+    return (log is not None) and (bool(np.any((log["time"] >= start) & (log["time"] <= stop))));
 
 ################################################################################
-################################ WRITE MANIFEST ################################
-  def write_manifest(self):
+################################## GET FIELDS ##################################
+  def get_fields(self, path):
     """
-    Write manifest to manifest file.
+    Return all fields in a data table, from the first data store containing it.
+
+    Parameters
+    ----------
+    path : str
+      HDF5 path to the data table.
+
+    Returns
+    -------
+    fields : list
+      List containing the fields of the data table.
+
+    Raises
+    ------
+    NonexistantLocationException : :class:`NonexistantLocationException`
+      Specified path does not exist.
     """
 
-    fd = open(self.manifest_path, "w");
-    fd.write("manifest = " + repr(self.manifest) + "\n");
-    fd.close();
+    for store in self.stores:
+      if (store.manifest.has_key(path)):
+        return store.get_fields(path);
+    for store in self.stores: # table only in append logs
+      dtype = store.log_dtype(path);
+      if (dtype is not None):
+        return list(dtype.names);
+    raise NonexistantLocationException("Nonexistant path: \"%s\"" % ( path ));
 
 ################################################################################
-############################## CREATE DESCRIPTION ##############################
+##################################### RUN ######################################
+  def run(self, function, tasks, persistent=False):
+    """
+    Run a function on each task, in parallel if more than one worker is configured and there is more than one task.
+
+    Parameters
+    ----------
+    function : function
+      Module-level function to run.
+    tasks : list
+      Arguments of each call.
+    persistent : bool
+      Whether to run the tasks in the worker pool of this object, which is started on first use and kept until :meth:`close` (default is False - start a pool for this call only).
+
+    Returns
+    -------
+    results : list
+      Results, in the order of :literal:`tasks`.
+    """
+
+    if ((self.workers > 1) and (len(tasks) > 1) and (persistent)):
+      if (self.pool is None):
+        self.pool = multiprocessing.Pool(self.workers);
+      return self.pool.map(function, tasks);
+    elif ((self.workers > 1) and (len(tasks) > 1)):
+      pool = multiprocessing.Pool(min(self.workers, len(tasks)));
+      try:
+        return pool.map(function, tasks);
+      finally:
+        pool.close();
+        pool.join();
+    else:
+      return [ function(task) for task in tasks ];
+
+################################################################################
+#################################### CLOSE #####################################
+  def close(self):
+    """
+    Stop the worker pool used by :meth:`load`, if it was started.
+    """
+
+    if (self.pool is None):
+      return;
+
+    self.pool.close();
+    self.pool.join();
+    self.pool = None;
+
+################################################################################
+################################ LAZY MANIFEST #################################
+################################################################################
+class LazyManifest(dict):
+  """
+  Manifest which loads its contents from per-location shards on first use.
+
+  The manifest is split into a shard for the :literal:`FILES` entry, a shard for the :literal:`ROOT` entry, and one shard per location containing the entries of all tables in that location. Shards are stored as :samp:`manifest.d/{shard}.py`, and are loaded the first time one of their keys is accessed. Operations which need the whole manifest (e.g. :literal:`keys`, iteration) load all shards.
+
+  If the shard directory does not exist (e.g. a data store written by an older version), the full manifest file is loaded on first use instead.
+  """
+
+  def __init__(self, manifest_path, shard_path):
+    """
+    Create an empty lazy manifest. No files are read until a key is accessed.
+
+    Parameters
+    ----------
+    manifest_path : str
+      Path of the full manifest file.
+    shard_path : str
+      Path of the directory containing the manifest shards.
+    """
+
+    dict.__init__(self);
+    self.manifest_path = manifest_path;
+    self.shard_path = shard_path;
+    self.loaded = set();
+    self.all_loaded = False;
+
   @staticmethod
-  def create_description(df):
+  def shard_name(key):
     """
-    Create a PyTables description dict from a Pandas DataFrame.
+    Return the name of the shard containing a manifest key.
 
     Parameters
     ----------
-    df : pd.DataFrame
-      Dataframe to base description on (dtypes are automatically converted to PyTables column types).
+    key : str
+      Manifest key (:literal:`FILES`, :literal:`ROOT`, or HDF5 path to a table).
 
     Returns
     -------
-    descr : dict
-      PyTables description generated from the column dtypes of the dataframe.
+    shard : str
+      Name of the shard.
     """
 
-    descr = dict();
-    cols = df.columns.tolist();
-    dtypes = df.dtypes.tolist();
-    for i in range(len(cols)):
-      col = cols[i];
-      col_dtype = dtypes[i];
-      descr[col] = tables.Col.from_dtype(col_dtype, pos=i);
+    if ((key == "FILES") or (key == "ROOT")):
+      return key;
+    else:
+      return "location." + key.split("/")[1];
 
-    return descr;
+  def load_shard(self, shard):
+    """
+    Load a shard into the manifest, if it has not been loaded yet.
+
+    Parameters
+    ----------
+    shard : str
+      Name of the shard.
+    """
+
+    if ((self.all_loaded) or (shard in self.loaded)):
+      return;
+    if (not os.path.isdir(self.shard_path)):
+      self.load_all();
+      return;
+    self.loaded.add(shard);
+    filename = os.path.join(self.shard_path, shard + ".py");
+    if (os.path.exists(filename)):
+      temp = { };
+      execfile(filename, temp);
+      dict.update(self, temp["manifest"]);
+    elif ((shard == "FILES") or (shard == "ROOT")):
+      dict.__setitem__(self, shard, { });
+
+  def load_all(self):
+    """
+    Load all shards into the manifest.
+    """
+
+    if (self.all_loaded):
+      return;
+    if (os.path.isdir(self.shard_path)):
+      for filename in os.listdir(self.shard_path):
+        if (filename.endswith(".py")):
+          self.load_shard(filename[:-3]);
+      self.load_shard("FILES");
+      self.load_shard("ROOT");
+    else:
+      manifest = { "FILES": { }, "ROOT": { } };
+      if (os.path.exists(self.manifest_path)):
+        temp = { };
+        execfile(self.manifest_path, temp);
+        manifest = temp["manifest"];
+      dict.update(self, manifest);
+    self.all_loaded = True;
+
+  def __getitem__(self, key):
+    self.load_shard(LazyManifest.shard_name(key));
+    return dict.__getitem__(self, key);
+
+  def __setitem__(self, key, value):
+    self.load_shard(LazyManifest.shard_name(key));
+    dict.__setitem__(self, key, value);
+
+  def __contains__(self, key):
+    self.load_shard(LazyManifest.shard_name(key));
+    return dict.__contains__(self, key);
+
+  def has_key(self, key):
+    return self.__contains__(key);
+
+  def get(self, key, default=None):
+    if (self.__contains__(key)):
+      return dict.__getitem__(self, key);
+    else:
+      return default;
+
+  def keys(self):
+    self.load_all();
+    return dict.keys(self);
+
+  def values(self):
+    self.load_all();
+    return dict.values(self);
+
+  def items(self):
+    self.load_all();
+    return dict.items(self);
+
+  def __iter__(self):
+    self.load_all();
+    return dict.__iter__(self);
+
+  def __len__(self):
+    self.load_all();
+    return dict.__len__(self);
+
+  def __repr__(self):
+    self.load_all();
+    return dict.__repr__(self);
+
+################################################################################
+################################ ENCODED TABLE #################################
+################################################################################
+class EncodedTable(object):
+  """
+  Event table (only :literal:`time` and :literal:`tz` columns) stored in a compact encoding.
+
+  The table is stored as an HDF5 group (with the attribute :literal:`hdfqs_encoding`) containing the arrays:
+
+  +-----------+-------------------------------------------------------------------+
+  | base      | time of the first row of each block                               |
+  +-----------+-------------------------------------------------------------------+
+  | offset    | index of the first row of each block                              |
+  +-----------+-------------------------------------------------------------------+
+  | delta     | time difference from the previous row (0 for the first row of a   |
+  |           | block), or the difference of these differences for "delta2"       |
+  +-----------+-------------------------------------------------------------------+
+  | tz        | timezone of each run of rows with the same timezone               |
+  +-----------+-------------------------------------------------------------------+
+  | tz_offset | index of the first row of each run                                |
+  +-----------+-------------------------------------------------------------------+
+
+  Rows are split into blocks of :literal:`block_size` rows, so a range of rows can be decoded without reading the whole table. The small deltas compress much better than the raw times.
+
+  This class implements the subset of the :literal:`tables.Table` interface used by HDFQS (:literal:`nrows`, :literal:`colnames`, :literal:`read`, :literal:`read_where`, etc.), so encoded tables can be read in the same way as regular tables (see :meth:`HDFQS.open_table`).
+  """
+
+  block_size = 4096;
+
+  def __init__(self, group):
+    """
+    Open an encoded table.
+
+    Parameters
+    ----------
+    group : tables.Group
+      Group containing the encoded table.
+    """
+
+    self.group = group;
+    self.encoding = group._v_attrs["hdfqs_encoding"];
+    self.block_size = int(group._v_attrs["hdfqs_block_size"]);
+    self.name = group._v_name;
+    self.attrs = group._v_attrs;
+    self.filters = group.delta.filters;
+    self.dtype = np.dtype([ ( "time", np.int64 ), ( "tz", np.int8 ) ]);
+    self.colnames = list(self.dtype.names);
+    self.coldtypes = dict((x, self.dtype[x]) for x in self.colnames);
+    self.nrowsinbuf = 16 * self.block_size;
+
+  @staticmethod
+  def create(fd, where, name, encoding, title="", filters=None, expectedrows=1000, chunkshape=None):
+    """
+    Create an empty encoded table.
+
+    Parameters
+    ----------
+    fd : tables.File
+      HDF5 file to create the table in.
+    where : str
+      HDF5 path of the parent group (created if it does not exist).
+    name : str
+      Name of the table.
+    encoding : str
+      "delta" or "delta2" (see :meth:`HDFQS.write`).
+    title : str
+      Descriptive name of table.
+    filters : tables.Filters
+      PyTables filter for the arrays.
+    expectedrows : int
+      Expected number of rows, used to choose the chunk size of the arrays (default is 1000).
+    chunkshape : tuple
+      Chunk shape of the :literal:`delta` array (default is None - chosen from :literal:`expectedrows`).
+
+    Returns
+    -------
+    table : :class:`EncodedTable`
+      The new table.
+    """
+
+    if (encoding not in [ "delta", "delta2" ]):
+      raise InconsistentArgumentsException("Unsupported encoding \"%s\"" % ( encoding ));
+    group = fd.createGroup(where, name, title, createparents=True);
+    group._v_attrs["hdfqs_encoding"] = encoding;
+    group._v_attrs["hdfqs_block_size"] = EncodedTable.block_size;
+    nblocks = max(expectedrows // EncodedTable.block_size, 1);
+    for ( array, atom ) in [ ( "base", tables.Int64Atom() ), ( "offset", tables.Int64Atom() ), ( "tz", tables.Int8Atom() ), ( "tz_offset", tables.Int64Atom() ) ]:
+      fd.createEArray(group, array, atom, ( 0, ), filters=filters, expectedrows=nblocks);
+    fd.createEArray(group, "delta", tables.Int64Atom(), ( 0, ), filters=filters, expectedrows=expectedrows, chunkshape=chunkshape);
+
+    return EncodedTable(group);
+
+  @property
+  def nrows(self):
+    return self.group.delta.nrows;
+
+  @property
+  def shape(self):
+    return ( self.nrows, );
+
+  def __len__(self):
+    return self.nrows;
+
+  def __getitem__(self, i):
+    return self.read(i, i + 1)[0];
+
+  def search_sorted(self, value, side="left"):
+    """
+    Binary search the time column (see :meth:`HDFQS.search_sorted`).
+
+    The block containing the result is found from the base times of the blocks, and only that block is decoded.
+
+    Parameters
+    ----------
+    value : int64
+      Time to search for. The table must be sorted by time.
+    side : str
+      If "left", return the index of the first row with a time not less than :literal:`value`. If "right", return the index of the first row with a time greater than :literal:`value` (default is "left").
+
+    Returns
+    -------
+    index : int
+      Row index at which :literal:`value` would be inserted to keep the column sorted.
+    """
+
+    block = np.searchsorted(self.group.base[:], value, side=side) - 1;
+    if (block < 0):
+      return 0;
+    offset = self.group.offset[:];
+    first = offset[block];
+    last = offset[block + 1] if (block + 1 < len(offset)) else self.nrows;
+
+    return int(first + np.searchsorted(self.read(first, last)["time"], value, side=side));
+
+  def append(self, rows):
+    """
+    Encode rows and append them to the table.
+
+    Parameters
+    ----------
+    rows : np.ndarray
+      Structured array with the :literal:`time` and :literal:`tz` fields.
+    """
+
+    if (len(rows) == 0):
+      return;
+    tm = rows["time"].astype(np.int64);
+    tz = rows["tz"].astype(np.int8);
+    n = self.nrows;
+
+    starts = np.arange(0, len(tm), self.block_size);
+    delta = np.concatenate(( [ 0 ], np.diff(tm) ));
+    delta[starts] = 0;
+    if (self.encoding == "delta2"):
+      delta = np.concatenate(( [ 0 ], np.diff(delta) ));
+      delta[starts] = 0;
+    self.group.base.append(tm[starts]);
+    self.group.offset.append(starts + n);
+    self.group.delta.append(delta);
+
+    runs = np.concatenate(( [ 0 ], np.flatnonzero(tz[1:] != tz[:-1]) + 1 ));
+    if ((self.group.tz.nrows > 0) and (self.group.tz[-1] == tz[0])): # continue the last run
+      runs = runs[1:];
+    self.group.tz.append(tz[runs]);
+    self.group.tz_offset.append(runs + n);
+
+  def flush(self):
+    self.group._v_file.flush();
+
+  def truncate(self, nrows):
+    """
+    Remove the rows after the first :literal:`nrows` rows.
+
+    Parameters
+    ----------
+    nrows : int
+      Number of rows to keep. Must be the number of rows before one of the calls to :meth:`append`, since blocks start at each append.
+    """
+
+    blocks = int(np.searchsorted(self.group.offset[:], nrows, side="left"));
+    runs = int(np.searchsorted(self.group.tz_offset[:], nrows, side="left"));
+    self.group.base.truncate(blocks);
+    self.group.offset.truncate(blocks);
+    self.group.delta.truncate(nrows);
+    self.group.tz.truncate(runs);
+    self.group.tz_offset.truncate(runs);
+
+  def read(self, start=None, stop=None, step=None):
+    """
+    Decode a range of rows.
+
+    Parameters
+    ----------
+    start : int
+      First row to read (default is None - the first row of the table).
+    stop : int
+      Row after the last row to read (default is None - the end of the table).
+    step : int
+      Stride between rows (default is None - every row).
+
+    Returns
+    -------
+    rows : np.ndarray
+      Structured array with the :literal:`time` and :literal:`tz` fields.
+    """
+
+    nrows = self.nrows;
+    start = 0 if (start is None) else max(min(start, nrows), 0);
+    stop = nrows if (stop is None) else max(min(stop, nrows), start);
+    step = 1 if (step is None) else step;
+    rows = np.empty(len(range(start, stop, step)), dtype=self.dtype);
+    if (len(rows) == 0):
+      return rows;
+
+    # Decode the blocks containing the rows
+    offset = self.group.offset[:];
+    b0 = np.searchsorted(offset, start, side="right") - 1;
+    b1 = np.searchsorted(offset, stop, side="left");
+    r0 = offset[b0];
+    r1 = offset[b1] if (b1 < len(offset)) else nrows;
+    lengths = np.diff(np.append(offset[b0:b1], r1));
+    first = offset[b0:b1] - r0;
+    x = self.group.delta[r0:r1];
+    for i in range(2 if (self.encoding == "delta2") else 1):
+      x = np.cumsum(x);
+      x = x - np.repeat(x[first], lengths);
+    x = x + np.repeat(self.group.base[b0:b1], lengths);
+    rows["time"] = x[start - r0:stop - r0:step];
+
+    # Decode the timezone runs
+    tz_offset = self.group.tz_offset[:];
+    rows["tz"] = self.group.tz[:][np.searchsorted(tz_offset, np.arange(start, stop, step), side="right") - 1];
+
+    return rows;
+
+  def read_where(self, condition, condvars=None, start=None, stop=None, step=None):
+    """
+    Decode a range of rows, and return the rows matching a condition (see :literal:`tables.Table.read_where`).
+
+    Parameters
+    ----------
+    condition : str
+      Condition, evaluated with numexpr.
+    condvars : dict
+      Variables used in the condition, in addition to the columns.
+    start : int
+      First row to read (default is None - the first row of the table).
+    stop : int
+      Row after the last row to read (default is None - the end of the table).
+    step : int
+      Stride between rows (default is None - every row).
+
+    Returns
+    -------
+    rows : np.ndarray
+      Structured array with the :literal:`time` and :literal:`tz` fields.
+    """
+
+    rows = self.read(start, stop, step);
+    local_dict = dict(condvars) if (condvars is not None) else { };
+    local_dict.update((x, rows[x]) for x in self.colnames);
+
+    return rows[numexpr.evaluate(condition, local_dict=local_dict)];
+
+################################################################################
+############################### MODULE FUNCTIONS ###############################
+################################################################################
+def run_import_jobs(task):
+  """
+  Run the import jobs for one HDF5 file (see :meth:`HDFQS.import_files`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  task : tuple
+    Tuple containing the HDFQS root, the HDF5 file to write to (relative to the HDFQS root), and the list of jobs.
+
+  Returns
+  -------
+  nrows : int
+    Number of rows imported.
+  """
+
+  ( root, dest, jobs ) = task;
+  h = HDFQS(root, register=False);
+  dest_dir = os.path.dirname(os.path.join(root, dest));
+  if (not os.path.isdir(dest_dir)):
+    os.makedirs(dest_dir);
+  h.open_file(dest);
+  nrows = 0;
+  try:
+    for job in jobs:
+      args = dict((key, value) for ( key, value ) in job.items() if (key not in [ "filename", "dest", "path" ]));
+      nrows = nrows + h.import_csv(job["filename"], job["path"], **args);
+  finally:
+    h.close_file();
+
+  return nrows;
+
+def run_export(task):
+  """
+  Export one table (see :meth:`HDFQS.export`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  task : tuple
+    Tuple containing the HDFQS root, the manifest entries for the table, the HDF5 path to the table, the start and end of the time range, the output format, and the output directory.
+
+  Returns
+  -------
+  nrows : int
+    Number of rows exported.
+  """
+
+  ( root, manifest, path, start, stop, format, dest ) = task;
+  h = HDFQS(root, register=False);
+  h.manifest = manifest;
+  entries = h.query_entries(path, start, stop);
+  if (len(entries) == 0):
+    return 0;
+
+  # Get dtype and units from the first file
+  with hdf5_lock:
+    fd = tables.openFile(os.path.join(root, entries[0]["filename"]), mode="r");
+    t = HDFQS.open_table(fd.getNode(path));
+    dtype = t.dtype;
+    units = t.attrs["units"] if ("units" in t.attrs._v_attrnames) else { };
+    fd.close();
+
+  filename = os.path.join(dest, *path.strip("/").split("/")) + "." + format;
+  if (not os.path.isdir(os.path.dirname(filename))):
+    os.makedirs(os.path.dirname(filename));
+
+  nrows = 0;
+  if (format == "csv"):
+    fd = open(filename, "w");
+    fd.write(",".join(dtype.names) + "\n");
+    for chunk in h.iter_chunks(path, start, stop):
+      pd.DataFrame(chunk).to_csv(fd, header=False, index=False);
+      nrows = nrows + len(chunk);
+    fd.close();
+    fd = open(filename[:-4] + ".json", "w");
+    json.dump({ "path": path, "units": units, "dtypes": dict((name, dtype[name].str) for name in dtype.names) }, fd);
+    fd.close();
+  else:
+    schema = pa.schema([ pa.field(name, pa.from_numpy_dtype(dtype[name])) for name in dtype.names ], metadata={ "hdfqs.path": path, "hdfqs.units": json.dumps(units) });
+    if (format == "parquet"):
+      writer = pq.ParquetWriter(filename, schema);
+    else:
+      writer = pa.RecordBatchFileWriter(filename, schema);
+    for chunk in h.iter_chunks(path, start, stop):
+      batch = pa.RecordBatch.from_arrays([ pa.array(chunk[name]) for name in dtype.names ], schema=schema);
+      if (format == "parquet"):
+        writer.write_table(pa.Table.from_batches([ batch ]));
+      else:
+        writer.write_batch(batch);
+      nrows = nrows + len(chunk);
+    writer.close();
+
+  return nrows;
+
+def load_manifest(path):
+  """
+  Register an HDFQS data store and return its manifest (see :class:`HDFQSFederation`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  path : str
+    Path of root of HDFQS data store.
+
+  Returns
+  -------
+  manifest : dict
+    Manifest of the data store.
+  """
+
+  return HDFQS(path).manifest;
+
+def run_load(task):
+  """
+  Load data from one data store (see :meth:`HDFQSFederation.load`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  task : tuple
+    Tuple containing the HDFQS root, the manifest entries for the table, the HDF5 path to the table, the start and end of the time range, whether to merge the data, and other keyword arguments of :meth:`HDFQS.load`.
+
+  Returns
+  -------
+  data : dict
+    Data loaded, as returned by :meth:`HDFQS.load` with :literal:`output="dict"`.
+  """
+
+  ( root, manifest, path, start, stop, merge, kwargs ) = task;
+  h = HDFQS(root, register=False);
+  h.manifest = manifest;
+  return h.load(path, start, stop, output="dict", merge=merge, **kwargs);
+
+def verify_file(task):
+  """
+  Verify one file (see :meth:`HDFQS.verify`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  task : tuple
+    Tuple containing the HDFQS root, the name of the file relative to the root, and a dict mapping the HDF5 path of each table in the file to its manifest entry.
+
+  Returns
+  -------
+  result : tuple
+    Tuple containing the name of the file, its size in bytes, and a list of error messages (empty if the file is good).
+  """
+
+  ( root, relpath, expected ) = task;
+  filename = os.path.join(root, relpath);
+  errors = [ ];
+  with hdf5_lock:
+    try:
+      size = os.path.getsize(filename);
+      fd = tables.openFile(filename, mode="r");
+    except Exception as e:
+      return ( relpath, 0, [ "cannot open file (%s)" % ( e ) ] );
+
+    try:
+      found = set();
+      for location in fd.root:
+        for group in location:
+          for table in group:
+            table = HDFQS.open_table(table);
+            if ((table is None) or (table.shape == ( 0, ))):
+              continue;
+            path = "/" + location._v_name + "/" + group._v_name + "/" + table.name;
+            found.add(path);
+            start = None;
+            stop = None;
+            nrows = 0;
+            try:
+              step = max(table.nrowsinbuf, 1);
+              for i in range(0, table.nrows, step):
+                tm = table.read(i, min(i + step, table.nrows))["time"];
+                nrows = nrows + len(tm);
+                if (len(tm) > 0):
+                  start = tm.min() if (start is None) else min(start, tm.min());
+                  stop = tm.max() if (stop is None) else max(stop, tm.max());
+            except Exception as e:
+              errors.append("%s: read error at row %d (%s)" % ( path, nrows, e ));
+              continue;
+            if (path not in expected):
+              errors.append("%s: not in manifest" % ( path ));
+              continue;
+            entry = expected[path];
+            if (("rows" in entry) and (entry["rows"] != nrows)):
+              errors.append("%s: %d rows, manifest has %d" % ( path, nrows, entry["rows"] ));
+            if ((start != entry["start"]) or (stop != entry["stop"])):
+              errors.append("%s: time range [%d, %d], manifest has [%d, %d]" % ( path, start, stop, entry["start"], entry["stop"] ));
+      for path in sorted(set(expected.keys()) - found):
+        errors.append("%s: in manifest, not in file" % ( path ));
+    finally:
+      fd.close();
+
+  return ( relpath, size, errors );
+
+def run_map(task):
+  """
+  Load one segment of a table and apply the map function to it (see :meth:`HDFQS.map_reduce`).
+
+  This is a module-level function so it can be run by a :literal:`multiprocessing` worker.
+
+  Parameters
+  ----------
+  task : tuple
+    Tuple containing the HDFQS root, the manifest entries for the table, the HDF5 path to the table, the start and end of the segment, the length of context before the segment, the fields of the table, and the map function.
+
+  Returns
+  -------
+  result : object
+    Result of the map function.
+  """
+
+  ( root, manifest, path, start, stop, overlap, fields, map_fn ) = task;
+  h = HDFQS(root, register=False);
+  h.manifest = manifest;
+  data = h.load(path, start - overlap, stop, value_field=fields[1], output="dict", fields=fields, merge=True);
+
+  return map_fn(data, start, stop);
 
 ################################################################################
 ################################## EXCEPTIONS ##################################